@@ -0,0 +1,96 @@
+"""Completion-rate rollups shared by the pages and the plotting stage.
+
+Every breakdown of the completion rates (per region, activity class, category
+and country) comes from completion_rollups, which groups the rows once and is
+memoized per snapshot, or from query_rollups, which groups them inside the
+database. Groups are taken from the data; the orders below only
+decide how known groups are listed.
+"""
+import pandas as pd
+
+from data_context import memoize_per_frame
+
+KPI_COLUMNS = ['Environment', 'Health & Safety', 'Social']
+RATE_COLUMNS = KPI_COLUMNS + ['Grand Total']
+
+# Activities reported on their own; every other activity counts as ISI
+NAMED_ACTIVITIES = ['IST', 'IPS']
+ACTIVITY_CLASS_ORDER = ['IST', 'IPS', 'ISI']
+# Known regions come first in this order, any others follow sorted
+REGION_ORDER = ['EUROPE', 'LATAM', 'MEA', 'APAC', 'NORAM']
+
+# Rollup name -> grouping column
+DIMENSIONS = {
+    "region": "Region",
+    "activity_class": "Activity Class",
+    "category": "Category",
+    "country": "country",
+}
+
+
+def activity_class(activity):
+    """IST, IPS or ISI for each value of an Activity column."""
+    return activity.astype(object).where(activity.isin(NAMED_ACTIVITIES), "ISI")
+
+
+def order_groups(df, preferred):
+    known = [group for group in preferred if group in df.index]
+    others = sorted(group for group in df.index if group not in preferred)
+    return df.loc[known + others]
+
+
+@memoize_per_frame
+def completion_rollups(df):
+    """Mean completion rates per region, activity class, category and country.
+
+    The rows are grouped once by every dimension together, keeping the sum and
+    count of each rate; each rollup then re-aggregates that small frame. Means
+    skip missing rates, like Series.mean. Dimensions missing from `df` (e.g.
+    country before the site merge) are left out. Returns {rollup name: DataFrame
+    indexed by group}.
+    """
+    keys = pd.DataFrame(index=df.index)
+    for name, column in DIMENSIONS.items():
+        if name == "activity_class":
+            keys[column] = activity_class(df['Activity'])
+        elif column in df.columns:
+            keys[column] = df[column].astype(object)
+
+    rates = df[RATE_COLUMNS].astype('float64')
+    counts = rates.notna().astype('int64').add_suffix(' count')
+    grouped = pd.concat([rates, counts], axis=1).groupby(
+        [keys[column] for column in keys.columns], dropna=False
+    ).sum()
+    return rollups_from_groups(grouped)
+
+
+def query_rollups(table="completion_rates"):
+    """completion_rollups of a database table (see database), grouped inside SQLite."""
+    import database
+
+    available = database.table_columns(table)
+    # Same classes as activity_class: a missing Activity is not IN the list either
+    named = ", ".join(f"'{activity}'" for activity in NAMED_ACTIVITIES)
+    expressions = {"Activity Class": f'CASE WHEN "Activity" IN ({named}) THEN "Activity" ELSE \'ISI\' END'}
+    by = [column for column in DIMENSIONS.values() if column in available or column in expressions]
+    grouped = database.aggregate(table, RATE_COLUMNS, by=by, how=["sum", "count"], expressions=expressions)
+    # SUM of a group without any rate is NULL, where pandas sums to 0
+    grouped = grouped.rename(columns={f"{column} sum": column for column in RATE_COLUMNS})
+    grouped[RATE_COLUMNS] = grouped[RATE_COLUMNS].astype('float64').fillna(0)
+    return rollups_from_groups(grouped)
+
+
+def rollups_from_groups(grouped):
+    """The rollups from rate sums and counts grouped by every available dimension."""
+    count_columns = [f"{column} count" for column in RATE_COLUMNS]
+    rollups = {}
+    for name, column in DIMENSIONS.items():
+        if column not in grouped.index.names:
+            continue
+        totals = grouped.groupby(level=column).sum()
+        means = totals[RATE_COLUMNS] / totals[count_columns].where(totals[count_columns] > 0).to_numpy()
+        # Summed in float64; stored as float32 like the rates themselves
+        rollups[name] = means.astype('float32')
+    rollups["region"] = order_groups(rollups["region"], REGION_ORDER)
+    rollups["activity_class"] = order_groups(rollups["activity_class"], ACTIVITY_CLASS_ORDER)
+    return rollups
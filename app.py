@@ -1,62 +1,235 @@
 import os
 import sys
+import threading
+import time
 import webbrowser
+from multiprocessing import freeze_support
 import dash
+import flask
 from dash import dcc, html
 from dash.dependencies import Input, Output
 
 # Import the function to run preprocessing
 from preprocess import check_and_run_preprocessing
+from utils import get_default_period, get_period_selector
+from layout_cache import LayoutCache
+# pandas, plotly and the pages are imported on first use, so the server can bind without them
+from site_table import FILTER_COLUMNS
+
+STARTED = time.perf_counter()
+
+# "full" runs the preprocessing before the server starts. "fast" serves the last
+# good output right away and refreshes it in the background (the very first run,
+# with no output yet, still waits for it)
+STARTUP_MODE = os.environ.get("STARTUP_MODE", "full")
+# Seconds the background refresh of a fast start waits, so the first pages are served first.
+# Background refreshes (and the watcher) rewrite Output/ in place unless PUBLISH_MODE=snapshot
+# is set, which builds them in a separate process and swaps them in (see snapshots.py)
+STARTUP_REFRESH_DELAY = float(os.environ.get("STARTUP_REFRESH_DELAY", "10"))
+# Refresh the output whenever Input/ receives a new or changed export (see watcher.py)
+WATCH_INPUT = os.environ.get("WATCH_INPUT", "0") == "1"
+OPEN_BROWSER = os.environ.get("OPEN_BROWSER", "1") != "0"
+PORT = int(os.environ.get("PORT", "8050"))
 
 # Initialize the Dash app
-app = dash.Dash(__name__, meta_tags=[{"name": "viewport", "content": "width=device-width"}])
+# Page components (e.g. the site table) only exist once their page is rendered
+app = dash.Dash(
+    __name__,
+    meta_tags=[{"name": "viewport", "content": "width=device-width"}],
+    suppress_callback_exceptions=True,
+)
 app.title = "Financial Report"
 
 # Expose the server for Gunicorn to use
 server = app.server  # Gunicorn needs this to run the app
 
-# Layout of the app
-app.layout = html.Div([dcc.Location(id="url", refresh=False), html.Div(id="page-content")])
+# Shared plotly.js (and other figure files) referenced by the generated HTML figures
+FIGURE_ASSETS_DIR = os.path.join("Output", "Assets")
+
+@server.route("/figure-assets/<path:filename>")
+def serve_figure_asset(filename):
+    # The bundle name carries the plotly.js version, so it can be cached for a year
+    return flask.send_from_directory(os.path.abspath(FIGURE_ASSETS_DIR), filename, max_age=31536000)
+
+# Layout of the app, built per page load so the period selector sees the latest cube
+def serve_layout():
+    return html.Div([dcc.Location(id="url", refresh=False), get_period_selector(), html.Div(id="page-content")])
+
+app.layout = serve_layout
+
+# Page path -> route name; unknown paths show the overview
+ROUTES = {
+    "/dash-financial-report/price-performance": "price-performance",
+    "/dash-financial-report/portfolio-management": "portfolio-management",
+    "/dash-financial-report/fees": "fees",
+    "/dash-financial-report/full-view": "full-view",
+}
+
+# Built layouts per route, rebuilt when the Output/ files behind them change
+LAYOUT_CACHE = LayoutCache()
 
-@app.callback(Output("page-content", "children"), [Input("url", "pathname")])
-def display_page(pathname):
+def layout_cache_size():
+    """One layout per route for every period the selector can pick, plus the latest period."""
+    from pages.cube import cube_periods
+
+    return (len(ROUTES) + 1) * (12 * len(cube_periods()) + 1)
+
+@server.route("/layout-cache/stats")
+def layout_cache_stats():
+    return flask.jsonify(LAYOUT_CACHE.stats())
+
+@server.route("/snapshots")
+def snapshot_status():
+    """Published Output/ snapshots and the one being served (PUBLISH_MODE=snapshot)."""
+    from snapshots import KEEP_SNAPSHOTS, PUBLISH_MODE, current_snapshot, list_snapshots
+
+    return flask.jsonify({
+        "publish_mode": PUBLISH_MODE,
+        "current": current_snapshot(),
+        "snapshots": list_snapshots(),
+        "keep": KEEP_SNAPSHOTS,
+    })
+
+def route_sources(route, as_of=None):
+    """Files the layout of a route is built from."""
+    import database
     from pages import overview, pricePerformance, portfolioManagement, feesMins
+    from pages.cube import CUBE_FILE
+
+    modules = {
+        "overview": [overview],
+        "price-performance": [pricePerformance],
+        "portfolio-management": [portfolioManagement],
+        "fees": [feesMins],
+        "full-view": [overview, pricePerformance, portfolioManagement, feesMins],
+    }[route]
+    sources = [source for module in modules for source in module.SOURCE_FILES]
+    if database.enabled():
+        sources.append(database.DATABASE_FILE)
+    if as_of:
+        sources += [CUBE_FILE, os.path.join("Input", "Activity_Region_Category.csv")]
+    return sources
 
-    if pathname == "/dash-financial-report/price-performance":
-        return pricePerformance.create_layout(app)
-    elif pathname == "/dash-financial-report/portfolio-management":
-        return portfolioManagement.create_layout(app)
-    elif pathname == "/dash-financial-report/fees":
-        return feesMins.create_layout(app)
-    elif pathname == "/dash-financial-report/full-view":
+def build_page(route, as_of=None):
+    from pages import overview, pricePerformance, portfolioManagement, feesMins
+    from data_context import DataContext
+
+    # One context per build, so the Full View loads every artifact once for all four pages
+    context = DataContext(as_of)
+    if route == "price-performance":
+        return pricePerformance.create_layout(app, context)
+    elif route == "portfolio-management":
+        return portfolioManagement.create_layout(app, context)
+    elif route == "fees":
+        return feesMins.create_layout(app, context)
+    elif route == "full-view":
         return (
-            overview.create_layout(app),
-            pricePerformance.create_layout(app),
-            portfolioManagement.create_layout(app),
-            feesMins.create_layout(app),
+            overview.create_layout(app, context),
+            pricePerformance.create_layout(app, context),
+            portfolioManagement.create_layout(app, context),
+            feesMins.create_layout(app, context),
         )
     else:
-        return overview.create_layout(app)
+        return overview.create_layout(app, context)
+
+@app.callback(
+    Output("page-content", "children"),
+    [Input("url", "pathname"), Input("as-of-year", "value"), Input("as-of-month", "value")],
+)
+def display_page(pathname, year=None, month=None):
+    from pages.cube import selected_period
+
+    # Rates for the selected period come from the precomputed completion cube; a
+    # period it has no data for (or a month outside 1-12) shows the latest one
+    as_of = selected_period(year, month)
+    route = ROUTES.get(pathname, "overview")
+    LAYOUT_CACHE.resize(layout_cache_size())
+    return LAYOUT_CACHE.get_or_build(
+        (route, as_of), route_sources(route, as_of), lambda: build_page(route, as_of)
+    )
+
+@app.callback(
+    [Output("site-table", "data"), Output("site-table", "page_count"), Output("site-table-count", "children")],
+    [Input(f"site-filter-{suffix}", "value") for suffix in FILTER_COLUMNS.values()]
+    + [Input("site-table", "page_current"), Input("site-table", "page_size"), Input("site-table", "sort_by")]
+    + [Input("as-of-year", "value"), Input("as-of-month", "value")],
+)
+def update_site_table(*args):
+    import database
+    from pages.cube import selected_period
+    from site_table import clamp_paging, query_sites, query_sites_in_database, site_table_as_of
+
+    # Only the visible page of rows is sent to the browser
+    *filter_values, page_current, page_size, sort_by, year, month = args
+    page_current, page_size = clamp_paging(page_current, page_size)
+    filters = dict(zip(FILTER_COLUMNS, filter_values))
+    # Same period as the rest of the page; the database only holds the latest one
+    as_of = selected_period(year, month)
+    if as_of is None and database.available():
+        rows, total = query_sites_in_database(filters, sort_by, page_current, page_size)
+    else:
+        rows, total = query_sites(site_table_as_of(as_of), filters, sort_by, page_current, page_size)
+    page_count = max(1, -(-total // page_size))
+    return rows, page_count, f"{total} sites"
+
+def warm_caches():
+    """Build every route's layout for the default period and with no period selected.
+
+    Under gunicorn with preload_app this runs once in the master, so the parsed
+    artifacts, figures and layouts are shared copy-on-write by all workers.
+    """
+    periods = {None, get_default_period()}
+    LAYOUT_CACHE.resize(layout_cache_size())
+    for route in ["overview", *ROUTES.values()]:
+        for as_of in periods:
+            LAYOUT_CACHE.get_or_build(
+                (route, as_of), route_sources(route, as_of), lambda: build_page(route, as_of)
+            )
+    serve_layout()
+    return LAYOUT_CACHE.stats()["entries"]
+
+def has_snapshot():
+    """True when a previous preprocessing run completed (its lock file is only written on success)."""
+    from preprocess import LOCK_FILE
+
+    return os.path.exists(LOCK_FILE)
 
 def run_dashboard():
     """Run preprocessing first, then start the Dash app."""
     try:
-        # Run preprocessing step
-        print("Running preprocessing step...")
         file_name = "Filled_not filled.csv"  # Adjust this if needed
-        preprocessing_done = check_and_run_preprocessing(file_name)
-
-        if preprocessing_done:
-            print("Preprocessing completed successfully.")
+        if STARTUP_MODE == "fast" and has_snapshot():
+            print("Serving the last preprocessed output; refreshing it in the background...")
+            if WATCH_INPUT:
+                # The watcher starts by refreshing, and only if the inputs changed since the last run
+                from watcher import start_watcher
+                refresh = threading.Timer(STARTUP_REFRESH_DELAY, start_watcher)
+            else:
+                refresh = threading.Timer(STARTUP_REFRESH_DELAY, check_and_run_preprocessing, args=(file_name,))
+            refresh.daemon = True
+            refresh.start()
         else:
-            print("Preprocessing skipped as it was already completed.")
+            # Run preprocessing step
+            print("Running preprocessing step...")
+            preprocessing_done = check_and_run_preprocessing(file_name)
+
+            if preprocessing_done:
+                print("Preprocessing completed successfully.")
+            else:
+                print("Preprocessing skipped as it was already completed.")
+
+            if WATCH_INPUT:
+                from watcher import start_watcher
+                start_watcher()
 
         # Start the Dash app after preprocessing
-        port = 8050
-        url = f"http://127.0.0.1:{port}"
-        print(f"Dashboard will be available at {url}")
-        webbrowser.open(url)  # Open the app in a browser
-        app.run_server(debug=False, host="0.0.0.0", port=port)  # Use host="0.0.0.0" for external access
+        url = f"http://127.0.0.1:{PORT}"
+        print(f"Dashboard will be available at {url} (startup took {time.perf_counter() - STARTED:.2f}s)")
+        if OPEN_BROWSER:
+            webbrowser.open(url)  # Open the app in a browser
+        # Dash 2.x has app.run; run_server is the older name
+        run = getattr(app, "run", None) or app.run_server
+        run(debug=False, host="0.0.0.0", port=PORT)  # Use host="0.0.0.0" for external access
 
     except Exception as e:
         print(f"Error occurred during preprocessing or dashboard startup: {e}")
@@ -64,4 +237,5 @@ def run_dashboard():
 
 # This ensures the app is only started when directly run.
 if __name__ == "__main__":
+    freeze_support()  # Figure workers re-launch the frozen executable on Windows
     run_dashboard()  # Start the entire process
@@ -6,11 +6,13 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('Input/Activity_Region_Category.csv', 'Input')],
-    hiddenimports=[],
+    hiddenimports=['pipeline', 'pages.generate_data', 'pages.cube', 'pages.table', 'pages.plotting'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # Optional notebook/GUI integrations pulled in by dash and plotly; leaving them out
+    # shrinks what the one-file executable extracts on every start
+    excludes=['IPython', 'ipykernel', 'jupyter_client', 'matplotlib', 'tkinter'],
     noarchive=False,
     optimize=0,
 )
@@ -26,7 +28,7 @@ exe = EXE(
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    upx=False,  # UPX-packed libraries are decompressed on every start
     upx_exclude=[],
     runtime_tmpdir=None,
     console=True,
@@ -0,0 +1,265 @@
+"""Load-test the dashboard routes through the real Dash callback endpoint.
+
+Starts app:server locally (under gunicorn with --workers, or the built-in
+server with --server dash), then drives POST /_dash-update-component, the
+request display_page answers in the browser, for every route in turn. Each
+route gets --concurrency client threads for --duration seconds, after
+--warmup unmeasured requests. Reported per route:
+
+  throughput        completed requests per second
+  p50 / p95 / p99   latency in milliseconds (and the maximum)
+  payload           response body size in bytes
+  errors            non-200 responses and failed connections
+
+Preprocessed output must exist (run preprocess.py first). Use --url to test a
+server that is already running instead. Results are saved as JSON.
+
+    python benchmarks/load_test.py --workers 4 --concurrency 8 --duration 20
+    python benchmarks/load_test.py --workers 1 2 4 --concurrency 16 --routes overview full-view
+    python benchmarks/load_test.py --url http://127.0.0.1:8050 --concurrency 4
+"""
+import argparse
+import datetime
+import http.client
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from startup_benchmark import wait_for_response  # noqa: E402
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BASE_DIR, "benchmarks", "results")
+
+ROUTES = {
+    "overview": "/dash-financial-report/overview",
+    "price-performance": "/dash-financial-report/price-performance",
+    "portfolio-management": "/dash-financial-report/portfolio-management",
+    "fees": "/dash-financial-report/fees",
+    "full-view": "/dash-financial-report/full-view",
+}
+PERCENTILES = [50, 95, 99]
+
+
+def page_request(pathname, as_of=None):
+    """Body of the page-content callback for a route, as the browser sends it on navigation."""
+    year, month = as_of or (None, None)
+    return json.dumps({
+        "output": "page-content.children",
+        "outputs": {"id": "page-content", "property": "children"},
+        "inputs": [
+            {"id": "url", "property": "pathname", "value": pathname},
+            {"id": "as-of-year", "property": "value", "value": year},
+            {"id": "as-of-month", "property": "value", "value": month},
+        ],
+        "changedPropIds": ["url.pathname"],
+    }).encode("utf-8")
+
+
+class Client:
+    """One keep-alive connection, reopened whenever the server closes it."""
+
+    def __init__(self, base_url, timeout):
+        url = urllib.parse.urlsplit(base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.timeout = timeout
+        self.connection = None
+
+    def post(self, path, body):
+        """Returns (status, response bytes)."""
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            self.connection.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+            response = self.connection.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+        if response.will_close:
+            self.close()
+        return response.status, len(payload)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def percentile(sorted_values, q):
+    """Linearly interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def run_route(base_url, pathname, concurrency, duration, warmup, timeout, as_of=None):
+    """Drive one route with `concurrency` threads for `duration` seconds; returns its summary."""
+    body = page_request(pathname, as_of)
+    warm_client = Client(base_url, timeout)
+    for _ in range(warmup):
+        warm_client.post("/_dash-update-component", body)
+    warm_client.close()
+
+    latencies, sizes, errors = [], [], []
+    lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def worker():
+        client = Client(base_url, timeout)
+        while time.perf_counter() < deadline:
+            sent = time.perf_counter()
+            try:
+                status, size = client.post("/_dash-update-component", body)
+            except (OSError, http.client.HTTPException) as e:
+                with lock:
+                    errors.append(type(e).__name__)
+                continue
+            elapsed = time.perf_counter() - sent
+            with lock:
+                if status == 200:
+                    latencies.append(elapsed)
+                    sizes.append(size)
+                else:
+                    errors.append(f"HTTP {status}")
+        client.close()
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    summary = {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "error_kinds": sorted(set(errors)),
+        "wall_seconds": wall,
+        "throughput": len(latencies) / wall,
+        "latency_ms": {f"p{q}": percentile(latencies, q) * 1000 if latencies else None for q in PERCENTILES},
+        "payload_bytes": {
+            "mean": sum(sizes) / len(sizes) if sizes else None,
+            "min": min(sizes, default=None),
+            "max": max(sizes, default=None),
+        },
+    }
+    summary["latency_ms"]["max"] = latencies[-1] * 1000 if latencies else None
+    return summary
+
+
+def start_server(server, workers, threads, port, env):
+    """Start app:server on `port`; returns the process."""
+    if server == "gunicorn":
+        command = [sys.executable, "-m", "gunicorn", "app:server", "--config", "gunicorn.conf.py",
+                   "--bind", f"127.0.0.1:{port}", "--workers", str(workers), "--threads", str(threads)]
+    else:
+        # Dash's own threaded development server, as `python app.py` starts it
+        command = [sys.executable, "app.py"]
+    # The background refresh of a fast start would run in the middle of the measurement
+    env = {**os.environ, "STARTUP_MODE": "fast", "STARTUP_REFRESH_DELAY": "86400", "OPEN_BROWSER": "0",
+           "PORT": str(port), **env}
+    return subprocess.Popen(command, cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def format_ms(value):
+    return "       -" if value is None else f"{value:8.1f}"
+
+
+def print_summary(name, summary):
+    latency = summary["latency_ms"]
+    payload = summary["payload_bytes"]["mean"] or 0
+    print(f"  {name:<22} {summary['throughput']:8.1f} req/s  "
+          + "  ".join(f"{key} {format_ms(latency[key])}" for key in ("p50", "p95", "p99", "max"))
+          + f" ms  {payload:12,.0f} B  {summary['errors']} errors")
+
+
+def parse_as_of(value):
+    year, month = value.split("-")
+    return int(year), int(month)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--server", default="gunicorn", choices=["gunicorn", "dash"], help="server to start")
+    parser.add_argument("--workers", type=int, nargs="+", default=[4],
+                        help="gunicorn worker counts to test, one server start each")
+    parser.add_argument("--threads", type=int, default=1, help="threads per gunicorn worker")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8], help="client threads per route")
+    parser.add_argument("--duration", type=float, default=10, help="measured seconds per route")
+    parser.add_argument("--warmup", type=int, default=2, help="unmeasured requests per route")
+    parser.add_argument("--routes", nargs="+", choices=list(ROUTES), default=list(ROUTES))
+    parser.add_argument("--as-of", type=parse_as_of, metavar="YYYY-MM", help="period selected in the dashboard")
+    parser.add_argument("--env", nargs="*", default=[], metavar="NAME=VALUE",
+                        help="extra environment for the server, e.g. QUERY_BACKEND=sqlite")
+    parser.add_argument("--url", help="test this running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8060)
+    parser.add_argument("--timeout", type=float, default=300, help="seconds to wait for the server and a response")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/load-<server>.json)")
+    args = parser.parse_args()
+
+    env = dict(item.split("=", 1) for item in args.env)
+    server = "external" if args.url else args.server
+    worker_counts = [None] if args.url or args.server == "dash" else args.workers
+    runs = []
+    for workers in worker_counts:
+        process = None
+        base_url = args.url or f"http://127.0.0.1:{args.port}"
+        if not args.url:
+            process = start_server(args.server, workers, args.threads, args.port, env)
+            started = wait_for_response(base_url + "/", process, args.timeout)
+            print(f"{server} started in {started:.1f}s" + (f" with {workers} worker(s)" if workers else ""))
+        try:
+            for concurrency in args.concurrency:
+                print(f"concurrency {concurrency}, {args.duration:g}s per route:")
+                routes = {}
+                for name in args.routes:
+                    routes[name] = run_route(base_url, ROUTES[name], concurrency, args.duration, args.warmup,
+                                             args.timeout, args.as_of)
+                    print_summary(name, routes[name])
+                runs.append({"workers": workers, "threads": args.threads if workers else None,
+                             "concurrency": concurrency, "routes": routes})
+        finally:
+            if process is not None:
+                stop_server(process)
+
+    results = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count()},
+        "server": server,
+        "url": args.url,
+        "server_env": env,
+        "duration": args.duration,
+        "warmup": args.warmup,
+        "as_of": args.as_of,
+        "runs": runs,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{server}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Report the size of the payload each dashboard route sends to the browser.
+
+Every route's layout is built the way app.display_page builds it and measured as
+the JSON the page-content callback returns. With --compare the figures are
+rebuilt twice, with plotly.js inlined and with the shared locally served bundle,
+and both sizes are reported per route.
+
+    python benchmarks/payload_report.py [--compare]
+"""
+import argparse
+import json
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+ROUTES = {
+    "overview": "/dash-financial-report/overview",
+    "price-performance": "/dash-financial-report/price-performance",
+    "portfolio-management": "/dash-financial-report/portfolio-management",
+    "fees": "/dash-financial-report/fees",
+    "full-view": "/dash-financial-report/full-view",
+}
+
+
+def measure_payloads():
+    """Return the JSON size in bytes of the page content for every route."""
+    from plotly.utils import PlotlyJSONEncoder
+    import app as dashboard  # Importing the app also moves to BASE_DIR
+
+    return {
+        name: len(json.dumps(dashboard.display_page(pathname), cls=PlotlyJSONEncoder).encode("utf-8"))
+        for name, pathname in ROUTES.items()
+    }
+
+
+def rebuild_figures(mode):
+    """Regenerate the HTML figures from the current artifacts with the given plotly.js mode."""
+    from pages import plotting
+
+    plotting.PLOTLYJS_MODE = mode
+    plotting.generate_all_plots(
+        os.path.join("Output", "completion_rates_with_activity_region.csv"),
+        os.path.join("Output", "completion_rates_with_activity_region_with_country.csv"),
+        os.path.join("Output", "average_completion_rates_per_country.csv"),
+        max_workers=1,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--compare", action="store_true", help="measure inline and local plotly.js side by side")
+    args = parser.parse_args()
+
+    if not args.compare:
+        for name, size in measure_payloads().items():
+            print(f"{name:<22} {size / 1e6:8.2f} MB")
+        return
+
+    from pages import plotting
+
+    configured_mode = plotting.PLOTLYJS_MODE
+    results = {}
+    for mode in ("inline", "local"):
+        rebuild_figures(mode)
+        results[mode] = measure_payloads()
+    rebuild_figures(configured_mode)
+
+    print(f"{'route':<22} {'inline':>10} {'local':>10} {'saved':>7}")
+    for name in ROUTES:
+        inline, local = results["inline"][name], results["local"][name]
+        print(f"{name:<22} {inline / 1e6:8.2f}MB {local / 1e6:8.2f}MB {1 - local / inline:7.1%}")
+    bundle = os.path.join(plotting.PLOTS_DIR, plotting.PLOTLYJS_FILE)
+    print(f"plotly.js is downloaded once and cached: {os.path.getsize(bundle) / 1e6:.2f} MB ({plotting.PLOTLYJS_FILE})")
+
+
+if __name__ == "__main__":
+    main()
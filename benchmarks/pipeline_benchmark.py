@@ -0,0 +1,195 @@
+"""Time every preprocessing stage on synthetic inputs from 10k to 10M+ rows.
+
+For each (rows, sites) size a synthetic export is generated (see
+synthetic_data.py, cached under --workdir) and the stages run there one by one,
+handing their DataFrames on and writing their artifacts, as preprocessing does:
+the three DataImpactTracker.run_frames steps, the completion cube, the dimension
+tables, the table merge and HTML table, and every plotting function. The wall time of each stage is
+saved as JSON; --compare prints the change against an earlier result file.
+
+    python benchmarks/pipeline_benchmark.py --rows 10000 100000 1000000 --sites 100 1000
+    python benchmarks/pipeline_benchmark.py --compare benchmarks/results/pipeline-OLD.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_data import generate_inputs  # noqa: E402
+
+RESULTS_DIR = os.path.join(BASE_DIR, "benchmarks", "results")
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000]
+
+YEAR, MONTH = 2024, 11
+RATES_FILE = os.path.join("Output", "completion_rates_with_activity_region.csv")
+COUNTRY_FILE = os.path.join("Output", "completion_rates_with_activity_region_with_country.csv")
+COUNTRY_AVERAGES_FILE = os.path.join("Output", "average_completion_rates_per_country.csv")
+
+
+def default_sites(rows):
+    """Sites grow with the export: about 60 rows per site, between 20 and 50,000."""
+    return max(20, min(50_000, rows // 60))
+
+
+def pipeline_stages():
+    """Ordered (name, callable) pairs; each runs in the dataset folder."""
+    import pandas as pd
+
+    from dimensions import build_dimensions, save_dimensions
+    from pages import cube, generate_data, plotting, table
+    from storage import read_artifact
+
+    tracker = generate_data.create_tracker(chunksize=None)
+    state = {}
+
+    def ingest():
+        state["filled"] = tracker.ingest()
+
+    def pivot():
+        state["pivot"] = tracker.pivot(state["filled"], year_to_analyze=YEAR)
+
+    def completion_rates():
+        state["completion_rates"] = tracker.completion_rates(state["pivot"], current_month=MONTH, year_to_analyze=YEAR)
+
+    def build_cube():
+        cube.save_completion_cube(cube.build_completion_cube(state["filled"]))
+
+    def dimensions():
+        sites = generate_data.site_countries(state["filled"])
+        state["dimensions"] = build_dimensions(sites, pd.read_csv(tracker.activity_region_file))
+        save_dimensions(state["dimensions"])
+
+    def country_averages():
+        state["country_averages"] = plotting.calculate_average_completion_per_country(COUNTRY_FILE, COUNTRY_AVERAGES_FILE)
+
+    return [
+        ("generate_data.ingest", ingest),
+        ("generate_data.pivot", pivot),
+        ("generate_data.completion_rates", completion_rates),
+        ("completion_cube", build_cube),
+        ("dimensions", dimensions),
+        ("table.add_country_to_completion_data",
+         lambda: table.add_country_to_completion_data(state["dimensions"], RATES_FILE, COUNTRY_FILE)),
+        ("table.generate_html_table", lambda: table.generate_html_table(read_artifact(COUNTRY_FILE))),
+        ("plotting.region_completions", lambda: plotting.calculate_and_plot_region_completions(RATES_FILE)),
+        ("plotting.region_heatmap", lambda: plotting.calculate_and_plot_region_completions_heatmap(RATES_FILE)),
+        ("plotting.country_averages", country_averages),
+        ("plotting.grand_total_map", lambda: plotting.plot_grand_total_map(state["country_averages"])),
+        ("plotting.activity_completions", lambda: plotting.calculate_and_plot_activity_completions(RATES_FILE)),
+    ]
+
+
+def run_size(workdir, rows, sites, repeat, seed):
+    """Generate (or reuse) one dataset and return the best-of-`repeat` time per stage."""
+    dataset_dir = os.path.join(workdir, f"rows{rows}_sites{sites}_seed{seed}")
+    start = time.perf_counter()
+    input_dir = generate_inputs(dataset_dir, rows, sites, seed)
+    print(f"Dataset {rows:,} rows x {sites:,} sites ready in {time.perf_counter() - start:.1f}s")
+
+    previous_dir = os.getcwd()
+    os.chdir(dataset_dir)
+    os.makedirs(os.path.join("Output", "Assets"), exist_ok=True)
+    try:
+        stages = {}
+        for _ in range(repeat):
+            for name, stage in pipeline_stages():
+                start = time.perf_counter()
+                stage()
+                seconds = time.perf_counter() - start
+                stages[name] = min(seconds, stages.get(name, seconds))
+    finally:
+        os.chdir(previous_dir)
+
+    return {
+        "rows": rows,
+        "sites": sites,
+        "input_bytes": os.path.getsize(os.path.join(input_dir, "Filled_not filled.csv")),
+        "stages": stages,
+        "total": sum(stages.values()),
+    }
+
+
+def environment():
+    import numpy
+    import pandas
+    from storage import INTERMEDIATE_FORMAT
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "pandas": pandas.__version__,
+        "numpy": numpy.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "intermediate_format": INTERMEDIATE_FORMAT,
+    }
+
+
+def compare(baseline_file, results):
+    """Print each stage's time against the same size in an earlier result file."""
+    with open(baseline_file, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    baseline_runs = {(run["rows"], run["sites"]): run for run in baseline["runs"]}
+    print(f"Against {baseline_file} ({baseline['environment'].get('commit') or 'unknown commit'})")
+    for run in results["runs"]:
+        base = baseline_runs.get((run["rows"], run["sites"]))
+        if base is None:
+            continue
+        print(f"\n{run['rows']:,} rows x {run['sites']:,} sites")
+        for name, seconds in list(run["stages"].items()) + [("total", run["total"])]:
+            before = base["stages"].get(name) if name != "total" else base["total"]
+            if before:
+                print(f"  {name:<40} {before:9.3f}s -> {seconds:9.3f}s  {seconds / before:6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS)
+    parser.add_argument("--sites", type=int, nargs="+",
+                        help="site counts to combine with every row count (default: scaled with rows)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per size; the fastest is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=os.path.join(BASE_DIR, "benchmarks", "data"),
+                        help="where synthetic datasets are generated and kept")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/pipeline-<commit>.json)")
+    parser.add_argument("--compare", metavar="RESULT_FILE", help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    sizes = [(rows, sites) for rows in args.rows for sites in (args.sites or [default_sites(rows)])]
+    results = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "environment": environment(),
+        "runs": [],
+    }
+    for rows, sites in sizes:
+        run = run_size(args.workdir, rows, sites, args.repeat, args.seed)
+        results["runs"].append(run)
+        for name, seconds in run["stages"].items():
+            print(f"  {name:<40} {seconds:9.3f}s")
+        print(f"  {'total':<40} {run['total']:9.3f}s")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"pipeline-{results['environment']['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to: {output}")
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Measure how long the dashboard takes to start, from source or as the frozen build.
+
+Each run launches the app (`python app.py`, or the PyInstaller executable with
+--frozen), then records:
+
+  time_to_bind        until the server answers its first HTTP request
+  time_to_first_page  until the overview page content has also been returned
+
+STARTUP_MODE is "fast" by default, which serves the last preprocessed output;
+run once with --mode full first if Output/ is empty. Results are saved as JSON.
+
+    python benchmarks/startup_benchmark.py --runs 5
+    python benchmarks/startup_benchmark.py --frozen dist/app.exe
+"""
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BASE_DIR, "benchmarks", "results")
+POLL_INTERVAL = 0.02
+
+# Page-content callback request for the overview, as the browser sends it on first load
+FIRST_PAGE_REQUEST = {
+    "output": "page-content.children",
+    "outputs": {"id": "page-content", "property": "children"},
+    "inputs": [
+        {"id": "url", "property": "pathname", "value": "/"},
+        {"id": "as-of-year", "property": "value", "value": None},
+        {"id": "as-of-month", "property": "value", "value": None},
+    ],
+    "changedPropIds": ["url.pathname"],
+}
+
+
+def wait_for_response(url, process, timeout):
+    """Poll `url` until it answers; returns the seconds waited."""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"The app exited with code {process.returncode} before answering")
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                response.read()
+            return time.perf_counter() - start
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(POLL_INTERVAL)
+    raise TimeoutError(f"No response from {url} within {timeout}s")
+
+
+def request_first_page(base_url):
+    request = urllib.request.Request(
+        base_url + "/_dash-update-component",
+        data=json.dumps(FIRST_PAGE_REQUEST).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=120) as response:
+        return len(response.read())
+
+
+def measure_startup(command, mode, port, timeout):
+    env = dict(os.environ, STARTUP_MODE=mode, OPEN_BROWSER="0", PORT=str(port))
+    base_url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=BASE_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_response(base_url + "/", process, timeout)
+        time_to_bind = time.perf_counter() - start
+        payload = request_first_page(base_url)
+        time_to_first_page = time.perf_counter() - start
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return {"time_to_bind": time_to_bind, "time_to_first_page": time_to_first_page, "first_page_bytes": payload}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frozen", metavar="EXECUTABLE", help="measure the PyInstaller build instead of the source")
+    parser.add_argument("--mode", default="fast", choices=["fast", "full"], help="STARTUP_MODE for the app")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8050)
+    parser.add_argument("--timeout", type=float, default=300, help="seconds to wait for the server")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/startup-<build>-<mode>.json)")
+    args = parser.parse_args()
+
+    build = "frozen" if args.frozen else "source"
+    command = [os.path.abspath(args.frozen)] if args.frozen else [sys.executable, "app.py"]
+    runs = []
+    for i in range(args.runs):
+        run = measure_startup(command, args.mode, args.port, args.timeout)
+        runs.append(run)
+        print(f"run {i + 1}: bound in {run['time_to_bind']:.2f}s, "
+              f"first page in {run['time_to_first_page']:.2f}s ({run['first_page_bytes']:,} bytes)")
+
+    summary = {key: min(run[key] for run in runs) for key in ("time_to_bind", "time_to_first_page")}
+    print(f"best: bound in {summary['time_to_bind']:.2f}s, first page in {summary['time_to_first_page']:.2f}s")
+    results = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "build": build,
+        "command": command,
+        "mode": args.mode,
+        "runs": runs,
+        "best": summary,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"startup-{build}-{args.mode}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to: {output}")
+
+
+if __name__ == "__main__":
+    main()
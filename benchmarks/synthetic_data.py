@@ -0,0 +1,115 @@
+"""Generate synthetic inputs shaped like the real exports, at any scale.
+
+Writes "Filled_not filled.csv" (Region, country, Site, Date, KPI Category,
+Frequency, Completion) and the matching Activity_Region_Category.csv into an
+Input/ folder. Sites, months, KPI categories, frequencies and the filled share
+follow the proportions of the sample export; every row is drawn independently,
+so the row count and the number of sites can be scaled separately.
+
+    python benchmarks/synthetic_data.py --rows 1000000 --sites 2000 --output /tmp/bench
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Export region -> (Activity_Region_Category region, countries)
+REGIONS = {
+    "Europe": ("EUROPE", ["Germany", "France", "Poland", "Spain", "Italy", "United Kingdom", "Sweden", "Romania"]),
+    "APAC": ("APAC", ["Australia", "China", "India", "Japan", "Singapore", "Vietnam"]),
+    "NORAM": ("NORAM", ["United States of America", "Canada"]),
+    "LATAM": ("LATAM", ["Brazil", "Mexico", "Chile", "Colombia", "Peru"]),
+    "Middle East & Africa": ("MEA", ["United Arab Emirates", "Egypt", "Morocco", "South Africa"]),
+}
+REGION_WEIGHTS = [0.39, 0.22, 0.18, 0.13, 0.08]
+ACTIVITIES = (["IST", "IPS", "ISI", "HoldCo"], [0.63, 0.26, 0.10, 0.01])
+CATEGORIES = (["SC", "Office", "Manufacturing", "R&D", "Office + R&D", "HQ", "Data Center"],
+              [0.36, 0.20, 0.19, 0.16, 0.05, 0.03, 0.01])
+KPI_CATEGORIES = (["Environment", "Health & Safety", "Social"], [0.50, 0.37, 0.13])
+FREQUENCIES = (["month", "quarter", "annual"], [0.74, 0.23, 0.03])
+COMPLETIONS = (["Filled", "Not Filled"], [0.63, 0.37])
+# Two full years of monthly submissions
+DATES = [f"{year}-{month:02d}-01 00:00:00" for year in (2023, 2024) for month in range(1, 13)]
+
+WRITE_CHUNK_ROWS = 1_000_000
+
+
+def generate_sites(sites, rng):
+    """One row per site: export region and country, plus the activity metadata."""
+    names = [f"Site {i:05d}" for i in range(sites)]
+    region_names = list(REGIONS)
+    regions = rng.choice(len(region_names), size=sites, p=REGION_WEIGHTS)
+    countries = [rng.choice(REGIONS[region_names[r]][1]) for r in regions]
+    return pd.DataFrame({
+        "Site": names,
+        "Region": [region_names[r] for r in regions],
+        "country": countries,
+        "Activity": rng.choice(ACTIVITIES[0], size=sites, p=ACTIVITIES[1]),
+        "Category": rng.choice(CATEGORIES[0], size=sites, p=CATEGORIES[1]),
+    })
+
+
+def categorical(values_and_weights, size, rng):
+    values, weights = values_and_weights
+    return pd.Categorical.from_codes(rng.choice(len(values), size=size, p=weights), values)
+
+
+def write_completion_export(path, sites_df, rows, rng):
+    """Write the row-level export in chunks, so 10M+ rows never sit in memory at once."""
+    region_codes, regions = pd.factorize(sites_df["Region"])
+    country_codes, countries = pd.factorize(sites_df["country"])
+    for start in range(0, rows, WRITE_CHUNK_ROWS):
+        size = min(WRITE_CHUNK_ROWS, rows - start)
+        site_rows = rng.integers(0, len(sites_df), size=size)
+        chunk = pd.DataFrame({
+            "Region": pd.Categorical.from_codes(region_codes[site_rows], regions),
+            "country": pd.Categorical.from_codes(country_codes[site_rows], countries),
+            "Site": pd.Categorical.from_codes(site_rows, sites_df["Site"]),
+            "Date": pd.Categorical.from_codes(rng.integers(0, len(DATES), size=size), DATES),
+            "KPI Category": categorical(KPI_CATEGORIES, size, rng),
+            "Frequency": categorical(FREQUENCIES, size, rng),
+            "Completion": categorical(COMPLETIONS, size, rng),
+        })
+        chunk.to_csv(path, mode="a" if start else "w", header=not start, index=False)
+
+
+def generate_inputs(output_dir, rows, sites, seed=0):
+    """Write Input/ for a synthetic dataset under `output_dir` (skipped if already there).
+
+    Returns the path of the Input folder.
+    """
+    input_dir = os.path.join(output_dir, "Input")
+    export_file = os.path.join(input_dir, "Filled_not filled.csv")
+    activity_file = os.path.join(input_dir, "Activity_Region_Category.csv")
+    if os.path.exists(export_file) and os.path.exists(activity_file):
+        return input_dir
+
+    os.makedirs(input_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    sites_df = generate_sites(sites, rng)
+    activity_df = pd.DataFrame({
+        "Activity": sites_df["Activity"],
+        "Region": sites_df["Region"].map({name: code for name, (code, _) in REGIONS.items()}),
+        "Category": sites_df["Category"],
+        "Location": sites_df["Site"],
+    })
+    activity_df.to_csv(activity_file, index=False)
+    # Written last, under a temporary name, so an interrupted run is regenerated next time
+    write_completion_export(export_file + ".tmp", sites_df, rows, rng)
+    os.replace(export_file + ".tmp", export_file)
+    return input_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--sites", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=".", help="folder to create Input/ in")
+    args = parser.parse_args()
+    print(f"Synthetic inputs written to: {generate_inputs(args.output, args.rows, args.sites, args.seed)}")
+
+
+if __name__ == "__main__":
+    main()
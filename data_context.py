@@ -0,0 +1,128 @@
+"""Data shared by the dashboard page builders.
+
+app.display_page creates one DataContext per request and hands it to every
+page it builds, so the Full View loads each artifact once instead of once per
+page. Contexts read through a process-wide cache that keeps each parsed
+artifact until its file changes on disk. The frames are shared: page builders
+must treat them as read-only.
+"""
+import functools
+import os
+import threading
+import weakref
+
+from figure_store import use_graph
+from layout_cache import file_signature
+from storage import read_artifact, resolve_artifact
+
+RATES_FILE = os.path.join("Output", "completion_rates_with_activity_region.csv")
+
+_artifacts = {}  # (kind, path) -> (file signature, value)
+_lock = threading.Lock()
+
+
+def cached_artifact(kind, path, resolved, load):
+    """Return `load()` for a file, reusing the value until the file at `resolved` changes."""
+    # The resolved path is part of it: a newer copy in another format replaces the old one
+    signature = (resolved, file_signature(resolved, validation="mtime"))
+    with _lock:
+        cached = _artifacts.get((kind, path))
+    if cached is None or cached[0] != signature:
+        cached = (signature, load())
+        with _lock:
+            _artifacts[(kind, path)] = cached
+    return cached[1]
+
+
+def load_table(path):
+    """Read a table artifact once per process, and again only after it changes."""
+    resolved = resolve_artifact(path)
+    if resolved is None:
+        raise FileNotFoundError(f"File not found: {path}")
+    return cached_artifact("table", path, resolved, lambda: read_artifact(path))
+
+
+def read_text(path):
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return file.read()
+    except UnicodeDecodeError:
+        with open(path, "r", encoding="latin-1") as file:
+            return file.read()
+
+
+def load_text(path):
+    """Read a text file (e.g. an HTML export) once per process; None if it does not exist."""
+    if not os.path.exists(path):
+        return None
+    return cached_artifact("text", path, path, lambda: read_text(path))
+
+
+_frame_results = {}  # (function, id(frame)) -> (weak reference to the frame, result)
+
+
+def memoize_per_frame(func):
+    """Cache `func(df)` for as long as that DataFrame object lives.
+
+    Frames from this module stay the same object until their file changes, so
+    derived structures (indexes, rollups) are computed once per snapshot. The
+    frames must not be modified after the first call.
+    """
+    @functools.wraps(func)
+    def wrapper(df):
+        key = (func, id(df))
+        cached = _frame_results.get(key)
+        if cached is None or cached[0]() is not df:
+            cached = (weakref.ref(df, lambda _: _frame_results.pop(key, None)), func(df))
+            _frame_results[key] = cached
+        return cached[1]
+
+    return wrapper
+
+
+class DataContext:
+    """The artifacts one round of page building needs, each loaded at most once.
+
+    `as_of` is an optional (year, month) whose completion rates come from the cube.
+    """
+
+    def __init__(self, as_of=None):
+        self.as_of = as_of
+        self._loaded = {}
+
+    def _get(self, key, load):
+        if key not in self._loaded:
+            self._loaded[key] = load()
+        return self._loaded[key]
+
+    def completion_rates(self):
+        def load():
+            from pages.cube import completion_rates_as_of
+
+            rates = completion_rates_as_of(*self.as_of) if self.as_of else None
+            return load_table(RATES_FILE) if rates is None else rates
+
+        return self._get("completion_rates", load)
+
+    def rollups(self):
+        """completion_rollups of the completion rates; grouped inside the database when it serves them."""
+        def load():
+            import database
+            from aggregations import completion_rollups, query_rollups
+
+            # The database holds the latest rates; other periods still come from the cube
+            if self.as_of is None and database.available():
+                return query_rollups()
+            return completion_rollups(self.completion_rates())
+
+        return self._get("rollups", load)
+
+    def table(self, path):
+        return self._get(("table", path), lambda: load_table(path))
+
+    def figure(self, plot_file):
+        """Parsed figure JSON for an HTML export, or None when pages should use the iframe."""
+        return self._get(("figure", plot_file), lambda: use_graph(plot_file))
+
+    def html(self, path):
+        return self._get(("html", path), lambda: load_text(path))
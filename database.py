@@ -0,0 +1,281 @@
+"""Optional embedded SQLite copy of the completion data, with a small query API.
+
+With QUERY_BACKEND=sqlite the pipeline loads the row-level export and the
+derived tables into Output/completion.sqlite. The dashboard then asks the
+database for filtered aggregations and pages of rows instead of holding the
+full frames in every worker:
+
+  facts                    one row per export row, Completion as 0/1 plus its Month Key
+  completion_rates         completion_rates_with_activity_region
+  completion_with_country  the same rates with the country of each site
+  completion_cube          filled/expected forms per site x KPI category x month
+  dim_site, dim_country, dim_activity_region   the dimension tables
+
+Site, Date and KPI Category are indexed on the facts and the cube. The file is
+written next to the live one and swapped in, so readers never see a partial
+database. When only the derived tables changed (e.g. a new current_month) the
+facts are copied over from the live file instead of being loaded again.
+Ad-hoc questions can be asked from the command line:
+
+    python database.py "SELECT Region, AVG(Completion) FROM facts GROUP BY Region"
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import urllib.request
+
+import pandas as pd
+
+from instrumentation import record_read, record_write
+from layout_cache import file_signature
+
+DATABASE_FILE = os.path.join("Output", "completion.sqlite")
+# "pandas" (default) serves the pages from the artifacts; "sqlite" also builds and queries the database
+QUERY_BACKEND = os.environ.get("QUERY_BACKEND", "pandas")
+# Export rows loaded into the fact table at a time
+DATABASE_CHUNKSIZE = 200_000
+
+FACT_TABLE = "facts"
+# key -> value pairs describing the file; "facts_version" identifies the export the facts came from
+METADATA_TABLE = "metadata"
+# Index name -> (table, columns)
+INDEXES = {
+    "facts_site": (FACT_TABLE, ["Site"]),
+    "facts_date": (FACT_TABLE, ["Date"]),
+    "facts_kpi_category": (FACT_TABLE, ["KPI Category"]),
+    "cube_site": ("completion_cube", ["Site"]),
+    "cube_kpi_category": ("completion_cube", ["KPI Category"]),
+    "cube_period": ("completion_cube", ["Year", "Month"]),
+}
+AGGREGATES = ["avg", "sum", "count", "min", "max"]
+
+_local = threading.local()
+_inherited = []
+
+
+def enabled():
+    return QUERY_BACKEND == "sqlite"
+
+
+def available(path=DATABASE_FILE):
+    """True when the pages should query the database (it is enabled and has been built)."""
+    return enabled() and os.path.exists(path)
+
+
+def plain_columns(df):
+    # SQLite stores plain values; categoricals go in as their labels
+    categorical = df.select_dtypes("category").columns
+    return df.astype({column: object for column in categorical})
+
+
+def stored_facts_version(path=DATABASE_FILE):
+    """facts_version recorded in a database file, or None."""
+    if not os.path.exists(path):
+        return None
+    connection = sqlite3.connect(path)
+    try:
+        row = connection.execute(
+            f"SELECT value FROM {METADATA_TABLE} WHERE key = 'facts_version'"
+        ).fetchone()
+    except sqlite3.Error:
+        return None
+    finally:
+        connection.close()
+    return row[0] if row else None
+
+
+def build_database(fact_chunks, tables, facts_version=None, path=DATABASE_FILE):
+    """Write the fact rows (an iterable of frames) and {table name: frame} to a new database file.
+
+    When the file at `path` already holds the facts of `facts_version` they are
+    copied from it and `fact_chunks` is not read. Returns the number of fact
+    rows loaded. The file replaces `path` only once it is complete.
+    """
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    reuse_facts = facts_version is not None and stored_facts_version(path) == facts_version
+    if reuse_facts:
+        shutil.copyfile(path, tmp_path)
+    connection = sqlite3.connect(tmp_path)
+    fact_rows = 0
+    try:
+        # A fresh file that is thrown away on failure needs no journal
+        connection.execute("PRAGMA journal_mode=OFF")
+        connection.execute("PRAGMA synchronous=OFF")
+        if not reuse_facts:
+            for chunk in fact_chunks:
+                plain_columns(chunk).to_sql(FACT_TABLE, connection, if_exists="append", index=False)
+                fact_rows += len(chunk)
+        for name, df in tables.items():
+            plain_columns(df).to_sql(name, connection, if_exists="replace", index=False)
+        for name, (table, columns) in INDEXES.items():
+            connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {quote(name)} ON {quote(table)} ({', '.join(map(quote, columns))})"
+            )
+        connection.execute(f"CREATE TABLE IF NOT EXISTS {METADATA_TABLE} (key TEXT PRIMARY KEY, value TEXT)")
+        connection.execute(f"INSERT OR REPLACE INTO {METADATA_TABLE} VALUES ('facts_version', ?)", [facts_version])
+        # Statistics for the query planner; kept facts keep theirs
+        if reuse_facts:
+            for name in tables:
+                connection.execute(f"ANALYZE {quote(name)}")
+        else:
+            connection.execute("ANALYZE")
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(tmp_path, path)
+    record_write(path)
+    facts = "facts kept" if reuse_facts else f"{fact_rows:,} fact rows"
+    print(f"Database saved to: {path} ({facts}, {len(tables)} derived tables)")
+    return fact_rows
+
+
+def thread_connections():
+    """{path: (file signature, connection, column names per table)} of the calling thread and process.
+
+    A gunicorn worker forked after the master warmed its caches inherits the
+    master's thread-local data; SQLite connections must not be used across a
+    fork, so a new process starts with an empty set (the inherited ones are left alone).
+    """
+    if getattr(_local, "pid", None) != os.getpid():
+        # Kept referenced: closing a parent's connection in the child could release the parent's file locks
+        _inherited.append(getattr(_local, "connections", None))
+        _local.pid = os.getpid()
+        _local.connections = {}
+    return _local.connections
+
+
+def connect(path=DATABASE_FILE):
+    """Read-only connection of the calling thread, reopened when the file is replaced."""
+    # The inode changes when a rebuilt file is swapped in
+    signature = file_signature(path, validation="mtime", inode=True)
+    if signature is None:
+        raise FileNotFoundError(f"File not found: {path}")
+    connections = thread_connections()
+    cached = connections.get(path)
+    if cached is None or cached[0] != signature:
+        if cached is not None:
+            cached[1].close()
+        uri = f"file:{urllib.request.pathname2url(os.path.abspath(path))}?mode=ro"
+        connections[path] = (signature, sqlite3.connect(uri, uri=True), {})
+    return connections[path][1]
+
+
+def query(sql, params=(), path=DATABASE_FILE):
+    """Run a read-only SQL query and return the result as a DataFrame."""
+    df = pd.read_sql_query(sql, connect(path), params=list(params))
+    record_read(path)
+    return df
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def table_columns(table, path=DATABASE_FILE):
+    """Column names of a table, read once per connection."""
+    connect(path)
+    columns = thread_connections()[path][2]
+    if table not in columns:
+        rows = connect(path).execute(f"PRAGMA table_info({quote(table)})").fetchall()
+        if not rows:
+            raise KeyError(f"No table {table!r} in {path}")
+        columns[table] = [row[1] for row in rows]
+    return columns[table]
+
+
+def column_sql(table, column, expressions=None, path=DATABASE_FILE):
+    """SQL for a column or a named expression.
+
+    Unknown names are rejected: SQLite would read a quoted unknown name as a string.
+    """
+    if expressions and column in expressions:
+        return expressions[column]
+    if column not in table_columns(table, path):
+        raise KeyError(f"No column {column!r} in table {table!r}")
+    return quote(column)
+
+
+def where_clause(table, filters=None, path=DATABASE_FILE):
+    """(WHERE clause, parameters) for the filters used by filter_index.FilterIndex.positions.
+
+    `filters` maps a column to the values to keep; a missing or empty entry keeps
+    every row.
+    """
+    conditions, params = [], []
+    for column, values in (filters or {}).items():
+        if values:
+            conditions.append(f"{column_sql(table, column, path=path)} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+    if not conditions:
+        return "", params
+    return " WHERE " + " AND ".join(conditions), params
+
+
+def aggregate(table, measures, by=(), how="avg", filters=None, expressions=None, path=DATABASE_FILE):
+    """Aggregate `measures` per group of `by`, inside the database.
+
+    `how` is one of AGGREGATES or a list of them; with a list every measure
+    gives one "<measure> <function>" column per function. `expressions` names
+    SQL expressions that `by` may group on like columns. Returns a frame
+    indexed by `by` (a single row when `by` is empty).
+    """
+    functions = [how] if isinstance(how, str) else list(how)
+    unknown = [function for function in functions if function not in AGGREGATES]
+    if unknown:
+        raise ValueError(f"Unknown aggregate {unknown[0]!r}; expected one of {AGGREGATES}")
+    by = list(by)
+    selected = [f"{column_sql(table, column, expressions, path)} AS {quote(column)}" for column in by]
+    for measure in measures:
+        sql = column_sql(table, measure, path=path)
+        for function in functions:
+            name = measure if len(functions) == 1 else f"{measure} {function}"
+            selected.append(f"{function.upper()}({sql}) AS {quote(name)}")
+    where, params = where_clause(table, filters, path)
+    sql = f"SELECT {', '.join(selected)} FROM {quote(table)}{where}"
+    if by:
+        sql += f" GROUP BY {', '.join(str(position) for position in range(1, len(by) + 1))}"
+    df = query(sql, params, path)
+    return df.set_index(by) if by else df
+
+
+def count_rows(table, filters=None, path=DATABASE_FILE):
+    where, params = where_clause(table, filters, path)
+    return int(query(f"SELECT COUNT(*) AS n FROM {quote(table)}{where}", params, path)["n"].iloc[0])
+
+
+def select_rows(table, columns, filters=None, sort_by=None, limit=None, offset=0, path=DATABASE_FILE):
+    """Rows of `table` matching the filters, in table order unless sorted.
+
+    `sort_by` is a list of (column, ascending) pairs; missing values sort last
+    and ties keep table order, like a stable sort_values.
+    """
+    selected = ", ".join(column_sql(table, column, path=path) for column in columns)
+    where, params = where_clause(table, filters, path)
+    order = []
+    for column, ascending in sort_by or []:
+        sql = column_sql(table, column, path=path)
+        order += [f"{sql} IS NULL", f"{sql} {'ASC' if ascending else 'DESC'}"]
+    order.append("rowid")
+    sql = f"SELECT {selected} FROM {quote(table)}{where} ORDER BY {', '.join(order)}"
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params += [int(limit), int(offset)]
+    return query(sql, params, path)
+
+
+def distinct_values(table, column, path=DATABASE_FILE):
+    """Sorted distinct non-missing values of a column."""
+    sql = column_sql(table, column, path=path)
+    return query(f"SELECT DISTINCT {sql} AS value FROM {quote(table)} WHERE {sql} IS NOT NULL ORDER BY 1",
+                 path=path)["value"].tolist()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    print(query(sys.argv[1]).to_string(index=False))
@@ -0,0 +1,109 @@
+"""Site, country and activity/region dimension tables with integer surrogate keys.
+
+Built once per preprocessing run from the deduplicated Site -> country pairs of
+the export and the Activity_Region_Category file, and saved next to the other
+artifacts. Each dimension row has a dense integer key (its position), so a
+lookup is an index into a small array instead of a string merge against
+row-level data:
+
+  dim_country          country_key, country
+  dim_activity_region  activity_region_key, Activity, Region, Category
+  dim_site             site_key, Site, country_key, activity_region_key
+                       (-1 when the export or the activity file does not list the site)
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from storage import read_artifact, write_artifact
+
+OUTPUT_DIR = "Output"
+DIMENSION_FILES = {
+    "site": os.path.join(OUTPUT_DIR, "dim_site.csv"),
+    "country": os.path.join(OUTPUT_DIR, "dim_country.csv"),
+    "activity_region": os.path.join(OUTPUT_DIR, "dim_activity_region.csv"),
+}
+ACTIVITY_REGION_COLUMNS = ["Activity", "Region", "Category"]
+# Country spellings of the export mapped to the names the map understands
+COUNTRY_ALIASES = {
+    'UAE': 'United Arab Emirates',
+}
+
+
+def encode(values):
+    """(int32 codes, unique values in order of first appearance); a missing value is a value too."""
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=False)
+    return codes.astype('int32'), uniques
+
+
+def build_dimensions(sites_df, activity_region_df):
+    """Dimension tables from Site -> country pairs and the activity/region rows.
+
+    Sites listed in the activity file come first, in file order, followed by
+    export sites it does not list. A site listed twice keeps its first row.
+    """
+    activity_region_df = activity_region_df.drop_duplicates(subset='Location')
+    sites_df = sites_df.drop_duplicates(subset='Site')
+
+    site_index = pd.Index(pd.concat([
+        activity_region_df['Location'].astype(object), sites_df['Site'].astype(object)
+    ]).drop_duplicates())
+
+    countries = sites_df['country'].astype(object).replace(COUNTRY_ALIASES)
+    country_codes, country_values = encode(countries)
+    site_country = np.full(len(site_index), -1, dtype='int32')
+    site_country[site_index.get_indexer(sites_df['Site'].astype(object))] = country_codes
+
+    combos = activity_region_df[ACTIVITY_REGION_COLUMNS].astype(object)
+    combo_codes, combo_values = encode(list(combos.itertuples(index=False, name=None)))
+    site_activity_region = np.full(len(site_index), -1, dtype='int32')
+    site_activity_region[site_index.get_indexer(activity_region_df['Location'].astype(object))] = combo_codes
+
+    return {
+        "site": pd.DataFrame({
+            "site_key": np.arange(len(site_index), dtype='int32'),
+            "Site": site_index.to_numpy(),
+            "country_key": site_country,
+            "activity_region_key": site_activity_region,
+        }),
+        "country": pd.DataFrame({
+            "country_key": np.arange(len(country_values), dtype='int32'),
+            "country": np.asarray(country_values, dtype=object),
+        }),
+        "activity_region": pd.DataFrame(
+            list(combo_values), columns=ACTIVITY_REGION_COLUMNS
+        ).rename_axis("activity_region_key").reset_index().astype({"activity_region_key": 'int32'}),
+    }
+
+
+def save_dimensions(dimensions):
+    for name, path in DIMENSION_FILES.items():
+        write_artifact(dimensions[name], path, index=False)
+    print(f"Dimension tables saved: {len(dimensions['site']):,} sites, {len(dimensions['country']):,} countries, "
+          f"{len(dimensions['activity_region']):,} activity/region combinations")
+
+
+def load_dimensions():
+    return {name: read_artifact(path) for name, path in DIMENSION_FILES.items()}
+
+
+def site_keys(dimensions, sites):
+    """site_key of every value in `sites`; -1 for sites the dimension does not know."""
+    return pd.Index(dimensions["site"]["Site"]).get_indexer(pd.Series(sites).astype(object)).astype('int32')
+
+
+def lookup(keys, values):
+    """values[keys] as an object array, with None where a key is -1."""
+    values = np.append(np.asarray(values, dtype=object), None)
+    return values[np.asarray(keys)]
+
+
+def site_country(dimensions, sites):
+    """(country, in export) for every value in `sites`, through the site and country keys.
+
+    Only sites that appear in the export have a country; the others get None.
+    """
+    keys = site_keys(dimensions, sites)
+    country_keys = np.where(keys >= 0, dimensions["site"]["country_key"].to_numpy()[keys], -1)
+    return lookup(country_keys, dimensions["country"]["country"]), country_keys >= 0
@@ -0,0 +1,40 @@
+"""Per-worker store of the figures built by pages/plotting.py.
+
+The plotting stage saves every figure as plotly JSON (numeric arrays binary
+encoded) next to its HTML export. Pages take the parsed figure from here and
+render it with dcc.Graph, so a response carries only the figure data instead of
+an HTML document. Each file is parsed once per worker and re-read only when it
+changes on disk.
+"""
+import json
+import os
+
+# "graph" renders figures natively with dcc.Graph; "iframe" embeds the HTML exports as before
+FIGURE_RENDERING = os.environ.get("FIGURE_RENDERING", "graph")
+
+_figures = {}  # JSON path -> (mtime, parsed figure)
+
+
+def figure_json_path(plot_file):
+    """Path of the JSON saved alongside an HTML figure export."""
+    return os.path.splitext(plot_file)[0] + ".json"
+
+
+def get_figure(plot_file):
+    """Return the parsed figure for an HTML export path, or None when there is no JSON for it."""
+    path = figure_json_path(plot_file)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    cached = _figures.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, "r", encoding="utf-8") as file:
+            cached = (mtime, json.load(file))
+        _figures[path] = cached
+    return cached[1]
+
+
+def use_graph(plot_file):
+    """Return the figure to render with dcc.Graph, or None to fall back to the HTML iframe."""
+    return get_figure(plot_file) if FIGURE_RENDERING == "graph" else None
@@ -0,0 +1,67 @@
+"""Per-snapshot indexes from dimension values to row positions.
+
+A FilterIndex is built once per DataFrame: for each indexed column it keeps
+the sorted row positions of every distinct value. A filter over several
+columns is then answered by merging the position lists of the selected values
+and intersecting across columns, without rescanning the frame.
+"""
+import numpy as np
+import pandas as pd
+
+from data_context import memoize_per_frame
+
+INDEX_COLUMNS = ["Activity", "Region", "Category", "Location", "country"]
+
+
+class FilterIndex:
+    def __init__(self, df, columns=INDEX_COLUMNS):
+        self.size = len(df)
+        self._positions = {}
+        for column in columns:
+            if column not in df.columns:
+                continue
+            # Rows sorted by value code; each value owns one contiguous run of positions
+            codes, uniques = pd.factorize(df[column], sort=True)
+            order = np.argsort(codes, kind="stable").astype(np.int64)
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            self._positions[column] = {
+                value: order[bounds[i]:bounds[i + 1]] for i, value in enumerate(uniques)
+            }
+
+    def value_positions(self, column, values):
+        entries = self._positions[column]
+        selected = [entries[value] for value in values if value in entries]
+        if not selected:
+            return np.empty(0, dtype=np.int64)
+        if len(selected) == 1:
+            return selected[0]
+        return np.sort(np.concatenate(selected))
+
+    def positions(self, filters=None):
+        """Sorted row positions matching every filter.
+
+        `filters` maps a column to the values to keep; a missing or empty entry keeps
+        every row.
+        """
+        selections = [
+            self.value_positions(column, values) for column, values in (filters or {}).items() if values
+        ]
+        if not selections:
+            selections = [np.arange(self.size)]
+        selections.sort(key=len)
+        result = selections[0]
+        for positions in selections[1:]:
+            result = np.intersect1d(result, positions, assume_unique=True)
+        return result
+
+    def select(self, df, filters=None):
+        """Rows of the indexed frame matching `filters`."""
+        if not any((filters or {}).values()):
+            return df
+        return df.iloc[self.positions(filters)]
+
+
+@memoize_per_frame
+def filter_index(df):
+    """Return the FilterIndex of a frame, building it on first use (once per snapshot)."""
+    return FilterIndex(df)
@@ -0,0 +1,32 @@
+"""Gunicorn settings for serving app:server.
+
+The app is imported and its caches warmed once in the master before the
+workers fork, so every worker starts warm and the parsed Output/ data is shared
+copy-on-write instead of loaded into each worker's heap. Set GUNICORN_PRELOAD=0
+to load the app in each worker instead (each then warms its own caches).
+"""
+import gc
+import os
+
+workers = int(os.environ.get("WEB_CONCURRENCY", "4"))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") != "0"
+
+
+def warm(log):
+    import app
+
+    entries = app.warm_caches()
+    log.info("Warmed %d page layouts", entries)
+
+
+def when_ready(server):
+    if preload_app:
+        warm(server.log)
+        # Keep the cyclic GC from writing to the warmed objects in the workers,
+        # which would copy their pages back into each worker
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        warm(worker.log)
@@ -0,0 +1,191 @@
+"""Timing, row, I/O and memory metrics for the preprocessing stages.
+
+Wrap a stage in `with stage("name") as record:` and set `record.rows_in` /
+`record.rows_out`. Wall and CPU time, the bytes of artifacts read and written
+inside the stage (reported by storage and the readers) and the peak resident
+memory while it ran are recorded. Every finished stage is appended as one JSON
+line to STAGE_LOG and passed to the callbacks registered with add_listener.
+Stages nest; a stage's I/O also counts towards the stages around it.
+"""
+import datetime
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# JSON lines log of finished stages, relative to the project root; STAGE_LOG= (empty) disables it
+STAGE_LOG = os.environ.get("STAGE_LOG", os.path.join("Output", "stage_log.jsonl"))
+# Seconds between resident memory samples while a stage runs
+MEMORY_SAMPLE_INTERVAL = 0.02
+
+# Groups the records of one preprocessing run; subprocesses inherit it through the environment
+RUN_ID = os.environ.get("STAGE_RUN_ID") or uuid.uuid4().hex[:12]
+
+_listeners = []
+_local = threading.local()
+_log_lock = threading.Lock()
+
+
+def start_run():
+    """Give the stages that follow (and subprocesses started from now on) a new run id."""
+    global RUN_ID
+    RUN_ID = uuid.uuid4().hex[:12]
+    os.environ["STAGE_RUN_ID"] = RUN_ID
+    return RUN_ID
+
+
+def add_listener(callback):
+    """Call `callback(record_dict)` for every finished stage."""
+    _listeners.append(callback)
+
+
+def remove_listener(callback):
+    if callback in _listeners:
+        _listeners.remove(callback)
+
+
+def current_rss():
+    """Resident memory of this process in bytes, or None where it cannot be read."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Not the current size but the process high-water mark (KB on Linux, bytes on macOS)
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if os.uname().sysname == "Darwin" else maxrss * 1024
+
+
+class StageRecord:
+    def __init__(self, name, parent=None, rows_in=None):
+        self.name = name
+        self.parent = parent
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.rss_start = current_rss()
+        self.peak_rss = self.rss_start
+        self.started = datetime.datetime.now().isoformat(timespec="milliseconds")
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self.wall_s = None
+        self.cpu_s = None
+
+    def sample_memory(self):
+        rss = current_rss()
+        if rss is not None and (self.peak_rss is None or rss > self.peak_rss):
+            self.peak_rss = rss
+
+    def finish(self):
+        self.sample_memory()
+        self.wall_s = time.perf_counter() - self._wall_start
+        self.cpu_s = time.process_time() - self._cpu_start
+
+    def to_dict(self):
+        def mb(value):
+            return None if value is None else round(value / 1e6, 2)
+
+        return {
+            "run_id": RUN_ID,
+            "pid": os.getpid(),
+            "stage": self.name,
+            "parent": self.parent,
+            "started": self.started,
+            "wall_s": round(self.wall_s, 4),
+            "cpu_s": round(self.cpu_s, 4),
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "rss_start_mb": mb(self.rss_start),
+            "peak_rss_mb": mb(self.peak_rss),
+        }
+
+
+def active_stages():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+# Memory sampler threads hold no locks a forked process could inherit (see pages.plotting.pool_context)
+SAMPLER_THREAD_NAME = "stage-memory-sampler"
+
+
+def sample_until(stop, records):
+    while not stop.wait(MEMORY_SAMPLE_INTERVAL):
+        for record in list(records):
+            record.sample_memory()
+
+
+def write_log(entry):
+    if not STAGE_LOG:
+        return
+    try:
+        with _log_lock:
+            os.makedirs(os.path.dirname(STAGE_LOG) or ".", exist_ok=True)
+            with open(STAGE_LOG, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        print(f"Warning: could not write the stage log {STAGE_LOG}: {e}")
+
+
+@contextmanager
+def stage(name, rows_in=None):
+    """Measure the enclosed block as a pipeline stage; yields its StageRecord."""
+    stack = active_stages()
+    record = StageRecord(name, parent=stack[-1].name if stack else None, rows_in=rows_in)
+    sampler = None
+    if not stack:
+        # One sampler per outermost stage keeps the peaks of all nested stages up to date
+        stop = threading.Event()
+        sampler = (stop, threading.Thread(target=sample_until, args=(stop, stack), name=SAMPLER_THREAD_NAME,
+                                          daemon=True))
+        sampler[1].start()
+    stack.append(record)
+    try:
+        yield record
+    finally:
+        stack.pop()
+        record.finish()
+        if sampler:
+            sampler[0].set()
+            sampler[1].join()
+        entry = record.to_dict()
+        rows = "" if record.rows_out is None else f", {record.rows_out:,} rows"
+        print(f"Stage {name}: {record.wall_s:.2f}s wall, {record.cpu_s:.2f}s CPU{rows}")
+        write_log(entry)
+        for callback in list(_listeners):
+            callback(entry)
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def record_read(path):
+    """Count a file read by the running stages."""
+    stack = active_stages()
+    if stack:
+        size = file_size(path)
+        for record in stack:
+            record.bytes_read += size
+
+
+def record_write(path):
+    """Count a file written by the running stages (call after the file is complete)."""
+    stack = active_stages()
+    if stack:
+        size = file_size(path)
+        for record in stack:
+            record.bytes_written += size
@@ -0,0 +1,116 @@
+"""Per-worker cache of the page layouts built by app.display_page.
+
+Each entry is keyed by route (plus the as-of period) and remembers a signature
+of the Output/ files the layout was built from. A request whose files are
+unchanged gets the cached layout; any change to them rebuilds it. The signature
+is the files' mtime and size, or their content hash with LAYOUT_CACHE_VALIDATION=hash
+for filesystems whose mtimes cannot be trusted. With `max_entries` set the
+least recently used layouts are dropped beyond it.
+"""
+import collections
+import hashlib
+import os
+import threading
+
+from figure_store import figure_json_path
+
+# "mtime" (default) or "hash"
+LAYOUT_CACHE_VALIDATION = os.environ.get("LAYOUT_CACHE_VALIDATION", "mtime")
+
+
+def watched_files(sources):
+    """Every file a layout may have read for the given sources.
+
+    Table artifacts are watched in all their storage formats and HTML figures
+    together with the JSON the pages render them from.
+    """
+    from storage import artifact_paths
+
+    files = []
+    for source in sources:
+        if source.endswith(".csv"):
+            files.extend(artifact_paths(source))
+        elif source.endswith(".html"):
+            files.extend([source, figure_json_path(source)])
+        else:
+            files.append(source)
+    return files
+
+
+def file_signature(path, validation=None, inode=False):
+    """Value that changes when the file changes, or None when it does not exist.
+
+    "mtime" gives (mtime, size), plus the inode with `inode` set, so a rebuilt
+    file swapped in by rename is told apart even with the same mtime and size.
+    "hash" gives the content hash.
+    """
+    validation = validation or LAYOUT_CACHE_VALIDATION
+    try:
+        if validation == "hash":
+            with open(path, "rb") as file:
+                return hashlib.sha1(file.read()).hexdigest()
+        stat = os.stat(path)
+        if inode:
+            return stat.st_ino, stat.st_mtime_ns, stat.st_size
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+
+class LayoutCache:
+    def __init__(self, validation=None, max_entries=None):
+        self.validation = validation or LAYOUT_CACHE_VALIDATION
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def signature(self, sources):
+        return tuple((path, file_signature(path, self.validation)) for path in watched_files(sources))
+
+    def get_or_build(self, key, sources, build):
+        """Return the layout cached under `key`, rebuilding it when any source changed."""
+        signature = self.signature(sources)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry[1]
+            self.misses += 1
+        layout = build()
+        with self._lock:
+            self._entries[key] = (signature, layout)
+            self._entries.move_to_end(key)
+            self._evict()
+        return layout
+
+    def resize(self, max_entries):
+        """Set the entry limit (None for no limit), dropping the least recently used layouts beyond it."""
+        with self._lock:
+            self.max_entries = max_entries
+            self._evict()
+
+    def _evict(self):
+        while self.max_entries is not None and len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "evictions": self.evictions,
+                "validation": self.validation,
+            }
@@ -0,0 +1,138 @@
+import os
+import pandas as pd
+
+from storage import read_artifact, resolve_artifact, write_artifact
+from pages.generate_data import KPI_YEARLY_REQUIREMENTS, MONTH_KEY, valid_frequency_mask
+
+# Define file paths
+OUTPUT_DIR = "Output"
+CUBE_FILE = os.path.join(OUTPUT_DIR, "completion_cube.csv")
+
+CUBE_KEYS = ['Site', 'KPI Category', 'Year', 'Month']
+
+def build_completion_cube(df):
+    """Count forms per site x KPI category x year x month in one pass over the ingest frame.
+
+    `Filled` counts completed forms and `Rows` counts every row with a valid frequency,
+    so a site that submitted nothing still shows up for the months it was expected.
+    """
+    df = df[valid_frequency_mask(df['Frequency']) & (df[MONTH_KEY] > 0)]
+    keys = df[MONTH_KEY]
+    cube = pd.DataFrame({
+        'Site': df['Site'],
+        'KPI Category': df['KPI Category'],
+        'Year': (keys // 100).astype('int16'),
+        'Month': (keys % 100).astype('int8'),
+        'Filled': df['Completion'].astype('int32'),
+    })
+    cube = cube.groupby(CUBE_KEYS, observed=True, sort=True)['Filled'].agg(['sum', 'size'])
+    cube = cube.rename(columns={'sum': 'Filled', 'size': 'Rows'}).astype('int32').reset_index()
+    return cube
+
+def merge_cubes(left, right):
+    """Sum two cubes; the counts are additive, so chunked ingest can build the cube piecewise."""
+    if left is None:
+        return right
+    merged = pd.concat([left, right], ignore_index=True)
+    # Chunks carry different categories; group on the plain values
+    merged[['Site', 'KPI Category']] = merged[['Site', 'KPI Category']].astype(object)
+    merged = merged.groupby(CUBE_KEYS, sort=True)[['Filled', 'Rows']].sum()
+    return merged.astype('int32').reset_index()
+
+def save_completion_cube(cube, output_file=CUBE_FILE):
+    output_file = write_artifact(cube, output_file, index=False)
+    print(f"Completion cube saved to: {output_file}")
+    return output_file
+
+def pivot_as_of(cube, year, month):
+    """Filled-form counts per site and KPI category for `year` up to and including `month`.
+
+    Same shape as DataImpactTracker.build_pivot_table: one row per site seen in the
+    period, with zero counts where nothing was filled.
+    """
+    period = cube[(cube['Year'] == year) & (cube['Month'] <= month)]
+    pivot = period.pivot_table(index='Site', columns='KPI Category', values='Filled',
+                               aggfunc='sum', fill_value=0, observed=True, sort=False)
+    pivot.index = pivot.index.astype(object)
+    pivot.columns = pivot.columns.astype(object)
+    return pivot.reindex(columns=list(KPI_YEARLY_REQUIREMENTS), fill_value=0)
+
+def available_periods(cube):
+    """Sorted (year, last month with data) pairs covered by the cube."""
+    last_months = cube.groupby('Year')['Month'].max()
+    return [(int(year), int(month)) for year, month in last_months.items()]
+
+def valid_as_of(periods, year, month):
+    """(year, month) when `periods` (see available_periods) has data for `year` and `month` is 1-12, else None."""
+    try:
+        year, month = int(year), int(month)
+    except (TypeError, ValueError):
+        return None
+    if 1 <= month <= 12 and any(y == year for y, _ in periods):
+        return year, month
+    return None
+
+# Per-process cache of the cube, refreshed when the artifact on disk changes. A
+# refresh swaps in a new dict in one assignment, so concurrent requests see
+# either the old cube with its periods and rates or the new one, never a mix
+_cube_cache = {}
+
+def cached_cube(cube_file=CUBE_FILE):
+    """The cache entry of the current cube ({'cube', 'periods', 'rates', ...}), or None without one."""
+    global _cube_cache
+    resolved = resolve_artifact(cube_file)
+    if resolved is None:
+        return None
+    entry = _cube_cache
+    key = (resolved, os.path.getmtime(resolved))
+    if entry.get('key') != key:
+        cube = read_artifact(cube_file)
+        entry = {'key': key, 'cube': cube, 'periods': available_periods(cube), 'rates': {}}
+        _cube_cache = entry
+    return entry
+
+def load_completion_cube(cube_file=CUBE_FILE):
+    entry = cached_cube(cube_file)
+    return entry['cube'] if entry else None
+
+def completion_rates_as_of(year, month, cube_file=CUBE_FILE):
+    """Completion rates table for any as-of date, computed from the cube and memoized.
+
+    Returns the same frame as completion_rates_with_activity_region, or None when
+    no cube has been built yet or it has no data for the period. The memoized
+    frame itself is returned, so its rollups are computed once per period (see
+    aggregations.completion_rollups); callers must not modify it.
+    """
+    from pages.generate_data import create_tracker
+
+    entry = cached_cube(cube_file)
+    as_of = valid_as_of(entry['periods'], year, month) if entry else None
+    if as_of is None:
+        return None
+    year, month = as_of
+    rates = entry['rates']
+    if (year, month) not in rates:
+        tracker = create_tracker()
+        if 'activity_region' not in entry:
+            entry['activity_region'] = pd.read_csv(tracker.activity_region_file)
+        pivot = pivot_as_of(entry['cube'], year, month)
+        rates[(year, month)] = tracker.build_completion_rates(
+            pivot.reset_index(), current_month=month, year_to_analyze=year,
+            activity_region_df=entry['activity_region'],
+        )
+    return rates[(year, month)]
+
+def cube_periods(cube_file=CUBE_FILE):
+    """available_periods of the current cube, computed once per loaded cube; [] without one."""
+    entry = cached_cube(cube_file)
+    return entry['periods'] if entry else []
+
+def selected_period(year, month, cube_file=CUBE_FILE):
+    """The period picked in the dashboard if the cube can answer it; None means the latest period."""
+    return valid_as_of(cube_periods(cube_file), year, month)
+
+if __name__ == "__main__":
+    from pages.generate_data import read_completion_data
+
+    filled_df = read_completion_data(os.path.join(OUTPUT_DIR, "filled_0_1.csv"), processed=True)
+    save_completion_cube(build_completion_cube(filled_df))
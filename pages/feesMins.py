@@ -2,30 +2,34 @@ import os
 import pandas as pd
 from dash import dcc, html
 from utils import Header
+from data_context import DataContext
+from storage import artifact_exists
 
 # Define constants for paths
 BASE_DIR = os.getcwd()  # Base directory
 ASSETS_DIR = os.path.join("Output", "Assets")  # Custom assets directory
 COMPLETION_MAP_FILE = os.path.join(ASSETS_DIR, "grand_total_map.html")  # Pre-existing map file
 CSV_FILE = os.path.join("Output", "completion_rates_with_activity_region.csv")
-
-# Helper function to preprocess columns
-def preprocess_columns(df, columns):
-    for col in columns:
-        df[col] = df[col].str.replace('%', '', regex=False).astype(float)
-    return df
+# Files the layout is built from (see layout_cache)
+SOURCE_FILES = [COMPLETION_MAP_FILE, CSV_FILE]
 
 # Render the existing map file
-def render_completion_map():
-    if not os.path.exists(COMPLETION_MAP_FILE):
+def render_completion_map(context):
+    # Render natively from the cached figure JSON when the plotting stage produced one
+    figure = context.figure(COMPLETION_MAP_FILE)
+    if figure is not None:
         return html.Div(
-            f"Error: Completion map file not found at {COMPLETION_MAP_FILE}.",
-            style={"color": "red", "font-size": "16px", "text-align": "center"},
+            [dcc.Graph(figure=figure, style={"width": "80%", "height": "500px", "margin": "0 auto"})],
+            style={"text-align": "center", "overflow": "hidden"},
         )
 
     # Load the map directly from the specified path
-    with open(COMPLETION_MAP_FILE, "r", encoding="utf-8") as file:
-        map_html = file.read()
+    map_html = context.html(COMPLETION_MAP_FILE)
+    if map_html is None:
+        return html.Div(
+            f"Error: Completion map file not found at {COMPLETION_MAP_FILE}.",
+            style={"color": "red", "font-size": "16px", "text-align": "center"},
+        )
 
     return html.Div(
         [
@@ -46,29 +50,20 @@ def render_completion_map():
 
 
 # Generate region completion table
-def create_region_completion_table(input_file):
-    if not os.path.exists(input_file):
+def create_region_completion_table(input_file, context):
+    if not artifact_exists(input_file):
         print(f"Error: File not found -> {input_file}")
         return html.Div(f"Error: Input file missing -> {input_file}")
     try:
-        df = pd.read_csv(input_file)
-        df = preprocess_columns(df, ['Environment', 'Health & Safety', 'Social', 'Grand Total'])
-
         # Calculate averages for regions
-        regions = ['EUROPE', 'LATAM', 'MEA', 'APAC', 'NORAM']
-        avg_completions = []
-        for region in regions:
-            region_data = df[df['Region'] == region]
-            if not region_data.empty:
-                avg_completions.append({
-                    'Region': region,
-                    'Environment': round(region_data['Environment'].mean()),
-                    'Health & Safety': round(region_data['Health & Safety'].mean()),
-                    'Social': round(region_data['Social'].mean()),
-                    ' Total': round(region_data['Grand Total'].mean())
-                })
-
-        avg_df = pd.DataFrame(avg_completions)
+        region_averages = context.rollups()["region"]
+        avg_df = pd.DataFrame({
+            'Region': region_averages.index,
+            'Environment': region_averages['Environment'].round().astype(int).to_numpy(),
+            'Health & Safety': region_averages['Health & Safety'].round().astype(int).to_numpy(),
+            'Social': region_averages['Social'].round().astype(int).to_numpy(),
+            ' Total': region_averages['Grand Total'].round().astype(int).to_numpy(),
+        })
 
         # Convert to HTML table
         table_header = [html.Tr([html.Th(col) for col in avg_df.columns])]
@@ -87,7 +82,8 @@ def create_region_completion_table(input_file):
         return html.Div("Error processing data.")
 
 # Main layout
-def create_layout(app):
+def create_layout(app, context=None):
+    context = context or DataContext()
     return html.Div(
         children=[
             Header(app),
@@ -97,7 +93,7 @@ def create_layout(app):
                     html.Div(
                         [
                             html.H6("Global Completion Map", className="subtitle padded"),
-                            render_completion_map()
+                            render_completion_map(context)
                         ],
                         className="row",
                         style={"width": "100%"}
@@ -106,7 +102,7 @@ def create_layout(app):
                     html.Div(
                         [
                             html.H6("Region Completion Rates", className="subtitle padded"),
-                            create_region_completion_table(CSV_FILE)
+                            create_region_completion_table(CSV_FILE, context)
                         ],
                         className="row",
                         style={"width": "100%"}
@@ -1,10 +1,14 @@
 import os
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
 import sys
 
+from storage import ChunkedArtifactWriter, read_artifact, write_artifact
+from instrumentation import record_read, stage
+
 # Define directories for input and output files
 INPUT_DIR = "Input"
 OUTPUT_DIR = "Output"
@@ -20,8 +24,8 @@ def read_dashboard_parameters(file_name="dashboard_parameters.txt"):
         # Running from a bundled .exe, use _MEIPASS to access bundled files
         bundle_dir = sys._MEIPASS  # Temporary folder where files are extracted
     else:
-        # Running from source code
-        bundle_dir = os.path.dirname(os.path.abspath(__file__))
+        # Running from source code; the parameters file sits in the project root, above pages/
+        bundle_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
     # Construct the path to the dashboard parameters file
     file_path = os.path.join(bundle_dir, file_name)
@@ -46,84 +50,271 @@ def read_dashboard_parameters(file_name="dashboard_parameters.txt"):
     
     return parameters
 
+# Ingest schema for "Filled_not filled.csv". Every text column has a handful of
+# distinct values repeated over millions of rows, so they are read as categoricals
+# and any per-value work (date parsing, Completion mapping) runs once per category.
+INGEST_DTYPES = {
+    'Region': 'category',
+    'country': 'category',
+    'Site': 'category',
+    'Date': 'category',
+    'KPI Category': 'category',
+    'Frequency': 'category',
+    'Completion': 'category',
+}
+# filled_0_1.csv has the same layout with Completion already mapped to 0/1
+PROCESSED_DTYPES = dict(INGEST_DTYPES, Completion='int8')
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+MONTH_KEY = "Month Key"  # int32 year * 100 + month, e.g. 202411; 0 when Date does not parse
+COMPLETION_FLAGS = {'Filled': 1, 'Not Filled': 0}  # Any other value counts as not filled
+VALID_FREQUENCIES = ['month', 'quarter', 'annual']
+# Completion rates are stored as float32 percentages (0-100); formatting as "NN%" is left to the pages
+RATE_COLUMNS = ['Environment', 'Health & Safety', 'Social', 'Grand Total']
+KPI_YEARLY_REQUIREMENTS = {"Environment": 17, "Health & Safety": 12, "Social": 5}
+
+def map_categories(series, values, missing, dtype):
+    """Broadcast one value per category of a categorical Series to every row.
+
+    `values` holds one entry per category; rows with a missing value get `missing`.
+    """
+    # Category code -1 (missing) indexes the trailing `missing` entry
+    lookup = np.append(np.asarray(values), missing).astype(dtype)
+    return pd.Series(lookup[series.cat.codes.to_numpy()], index=series.index)
+
+def completion_flags(series):
+    """Map the Completion categories to an int8 0/1 flag."""
+    categories = series.cat.categories
+    return map_categories(series, [COMPLETION_FLAGS.get(c, 0) for c in categories], 0, 'int8')
+
+def month_keys(series):
+    """Parse the Date categories with DATE_FORMAT into int32 year * 100 + month keys."""
+    dates = pd.to_datetime(series.cat.categories, format=DATE_FORMAT, errors='coerce')
+    keys = np.where(dates.isna(), 0, dates.year * 100 + dates.month)
+    return map_categories(series, keys, 0, 'int32')
+
+def valid_frequency_mask(series):
+    """Boolean mask of rows whose Frequency is one of VALID_FREQUENCIES, case-insensitively."""
+    valid = series.cat.categories.str.lower().isin(VALID_FREQUENCIES)
+    return map_categories(series, valid, False, bool)
+
+def required_forms_by_month():
+    """Forms each KPI category requires by the end of every month of the year.
+
+    Monthly Health & Safety forms, monthly plus quarterly Environment forms and
+    quarterly Social forms, with one extra annual form each for Environment and
+    Social in December, capped at KPI_YEARLY_REQUIREMENTS. Indexed by month 1-12.
+    """
+    months = np.arange(1, 13)
+    quarters_passed = (months - 1) // 3
+    year_end = (months == 12).astype(int)
+    return pd.DataFrame({
+        "Environment": np.minimum(months + quarters_passed + year_end, KPI_YEARLY_REQUIREMENTS["Environment"]),
+        "Health & Safety": np.minimum(months, KPI_YEARLY_REQUIREMENTS["Health & Safety"]),
+        "Social": np.minimum(quarters_passed + year_end, KPI_YEARLY_REQUIREMENTS["Social"]),
+    }, index=pd.Index(months, name="Month"))
+
+def apply_ingest_schema(df, processed=False):
+    """Add the int8 Completion flag (unless already `processed`) and the month key."""
+    if not processed:
+        df['Completion'] = completion_flags(df['Completion'])
+    df[MONTH_KEY] = month_keys(df['Date'])
+    return df
+
+def read_completion_data(input_file, processed=False):
+    """Read the raw export (or filled_0_1.csv when `processed`) with the ingest schema."""
+    if processed:
+        # Columnar copies may hold plain strings (see ChunkedArtifactWriter)
+        df = read_artifact(input_file, dtype=PROCESSED_DTYPES).astype(PROCESSED_DTYPES)
+    else:
+        df = pd.read_csv(input_file, dtype=INGEST_DTYPES)
+        record_read(input_file)
+    return apply_ingest_schema(df, processed)
+
+def read_completion_chunks(input_file, chunksize):
+    """Yield the raw export `chunksize` rows at a time with the ingest schema applied."""
+    record_read(input_file)
+    for chunk in pd.read_csv(input_file, dtype=INGEST_DTYPES, chunksize=chunksize):
+        yield apply_ingest_schema(chunk)
+
+def site_countries(df):
+    """One Site -> country row per site, keeping the first country a site appears with."""
+    return df[['Site', 'country']].drop_duplicates(subset='Site')
+
+class PivotCounter:
+    """Filled-form counts per site and KPI category, accumulated one frame at a time.
+
+    The counts are additive, so feeding an export in chunks yields exactly the pivot
+    that feeding it whole does, while only the counts stay in memory.
+    """
+    def __init__(self, year=None):
+        self.year = year
+        self.counts = None
+        # Dicts keep sites and categories in order of first appearance
+        self.sites = {}
+        self.categories = {}
+
+    def add(self, df):
+        if self.year:
+            df = df[df[MONTH_KEY] // 100 == self.year]
+        df = df[valid_frequency_mask(df['Frequency'])]
+        self.sites.update(dict.fromkeys(df['Site'].unique().tolist()))
+        self.categories.update(dict.fromkeys(df['KPI Category'].unique().tolist()))
+        counts = df[df['Completion'] == 1].groupby(['Site', 'KPI Category'], observed=True).size()
+        # Each chunk has its own categories, so align on the plain values
+        counts.index = pd.MultiIndex.from_arrays(
+            [counts.index.get_level_values(level).astype(object) for level in range(2)]
+        )
+        if self.counts is None:
+            self.counts = counts
+        else:
+            self.counts = self.counts.add(counts, fill_value=0).astype('int64')
+
+    def to_pivot(self):
+        count_df = self.counts.unstack(fill_value=0) if self.counts is not None and len(self.counts) else pd.DataFrame()
+        count_df = count_df.reindex(index=pd.Index(list(self.sites)), columns=pd.Index(list(self.categories)), fill_value=0)
+        return add_pivot_totals(count_df)
+
+def add_pivot_totals(count_df):
+    """Append the 'Total général' column and 'Total' row of Completed_Forms_Pivot."""
+    count_df = count_df.copy()
+    count_df['Total général'] = count_df.sum(axis=1)
+    total_row = count_df.sum(axis=0).to_frame().T
+    total_row.index = ['Total']
+    return pd.concat([count_df, total_row])
+
 # DataImpactTracker Class
 class DataImpactTracker:
-    def __init__(self, input_file, activity_region_file, output_folder):
+    def __init__(self, input_file, activity_region_file, output_folder, chunksize=None):
         self.input_file = input_file
         self.activity_region_file = activity_region_file
         self.output_folder = output_folder
+        # Rows per chunk for streaming ingest; None reads the whole export at once
+        self.chunksize = chunksize
 
-    @staticmethod
-    def transform_completion(value):
-        return 1 if value == 'Filled' else 0 if value == 'Not Filled' else value
-
-    def process_completion_data(self):
+    def load_completion_data(self):
         if not os.path.exists(self.input_file):
             raise FileNotFoundError(f"File not found: {self.input_file}")
-        df = pd.read_csv(self.input_file)
-        df['Completion'] = df['Completion'].apply(self.transform_completion)
-        processed_file = os.path.join(self.output_folder, "filled_0_1.csv")
-        df.to_csv(processed_file, index=False)
-        print(f"Processed completion data saved as: {processed_file}")
-        return processed_file
-
-    def generate_pivot_table(self, input_file, year=None):
-        if not os.path.exists(input_file):
-            raise FileNotFoundError(f"File not found: {input_file}")
-        df = pd.read_csv(input_file)
-        df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
-        if year:
-            df = df[df['Date'].dt.year == year]
-        valid_frequencies = ['month', 'quarter', 'annual']
-        df = df[df['Frequency'].str.lower().isin(valid_frequencies)]
-        filled_df = df[df['Completion'] == 1]
-        count_df = filled_df.groupby(['Site', 'KPI Category']).size().unstack(fill_value=0)
-        all_sites = df['Site'].unique()
-        all_categories = df['KPI Category'].unique()
-        count_df = count_df.reindex(index=all_sites, columns=all_categories, fill_value=0)
-        count_df['Total général'] = count_df.sum(axis=1)
-        total_row = count_df.sum(axis=0).to_frame().T
-        total_row.index = ['Total']
-        count_df = pd.concat([count_df, total_row])
-        pivot_table_file = os.path.join(self.output_folder, "Completed_Forms_Pivot.csv")
-        count_df.to_csv(pivot_table_file, float_format='%.0f')
-        print(f"Pivot table saved as: {pivot_table_file}")
-        return pivot_table_file
+        return read_completion_data(self.input_file)
+
+    def save_output(self, df, file_name, export_csv=False, **to_csv_kwargs):
+        """Write an artifact; only the final tables (`export_csv`) also get a CSV copy."""
+        output_file = os.path.join(self.output_folder, file_name)
+        return write_artifact(df, output_file, export_csv=export_csv, **to_csv_kwargs)
 
-    def calculate_completion_rates(self, input_file, current_month=None, year_to_analyze=None):
-        if not os.path.exists(input_file) or not os.path.exists(self.activity_region_file):
-            raise FileNotFoundError("Required input files are missing.")
-        df = pd.read_csv(input_file)
-        activity_region_df = pd.read_csv(self.activity_region_file)
-        kpi_yearly_requirements = {"Environment": 17, "Health & Safety": 12, "Social": 5}
+    @staticmethod
+    def build_pivot_table(df, year=None):
+        counter = PivotCounter(year=year)
+        counter.add(df)
+        return counter.to_pivot()
+
+    def build_completion_rates(self, df, current_month=None, year_to_analyze=None, activity_region_df=None):
+        if activity_region_df is None:
+            if not os.path.exists(self.activity_region_file):
+                raise FileNotFoundError("Required input files are missing.")
+            activity_region_df = pd.read_csv(self.activity_region_file)
         current_month = 12 if current_month is None else current_month
-        quarters_passed = (current_month - 1) // 3
-        kpi_required_forms_to_date = {
-            "Environment": min(round((current_month / 12) * 12) + quarters_passed + (1 if current_month == 12 else 0), 17),
-            "Health & Safety": min(round((current_month / 12) * 12), 12),
-            "Social": min(quarters_passed + (1 if current_month == 12 else 0), 5)
-        }
+        # A category with nothing due yet (Social before April) is left out of the Grand Total
+        kpi_required_forms_to_date = required_forms_by_month().loc[current_month].replace(0, np.nan)
         df['Environment'] = (df['Environment'] / kpi_required_forms_to_date["Environment"]) * 100
         df['Health & Safety'] = (df['Health & Safety'] / kpi_required_forms_to_date["Health & Safety"]) * 100
         df['Social'] = (df['Social'] / kpi_required_forms_to_date["Social"]) * 100
         df['Grand Total'] = df[['Environment', 'Health & Safety', 'Social']].mean(axis=1, skipna=True)
-        completion_rates = df[['Environment', 'Health & Safety', 'Social', 'Grand Total']].fillna(0).round(0).astype(int).astype(str) + '%'
+        completion_rates = df[RATE_COLUMNS].fillna(0).astype('float32')
         output_df = df.iloc[:, 0].to_frame().join(completion_rates)
         output_df.columns = ['Location', 'Environment', 'Health & Safety', 'Social', 'Grand Total']
-        merged_df = pd.merge(activity_region_df, output_df, on="Location", how="left")
+        # Left join on row positions: every activity row takes the rates of its location (the
+        # pivot has one row per site), NaN where the location has no completion data
+        positions = pd.Index(output_df['Location']).get_indexer(activity_region_df['Location'])
+        rates = np.vstack([output_df[RATE_COLUMNS].to_numpy(), np.full((1, len(RATE_COLUMNS)), np.nan, dtype='float32')])
+        merged_df = activity_region_df.reset_index(drop=True)
+        merged_df[RATE_COLUMNS] = rates[positions]
         if year_to_analyze:
             merged_df['Year to Analyze'] = year_to_analyze
-        merged_df = merged_df.sort_values(by="Location")
-        final_output_file = os.path.join(self.output_folder, "completion_rates_with_activity_region.csv")
-        merged_df.to_csv(final_output_file, index=False)
-        print(f"Completion rates saved as: {final_output_file}")
-        return final_output_file
+        return merged_df.sort_values(by="Location")
 
     def run(self, year_to_analyze=None, current_month=None):
-        processed_file = self.process_completion_data()
-        pivot_table_file = self.generate_pivot_table(processed_file, year=year_to_analyze)
-        final_output = self.calculate_completion_rates(pivot_table_file, current_month=current_month, year_to_analyze=year_to_analyze)
-        return final_output
+        """Run every stage and return the path of the final completion rates CSV."""
+        self.run_frames(year_to_analyze=year_to_analyze, current_month=current_month)
+        return os.path.join(self.output_folder, "completion_rates_with_activity_region.csv")
+
+    def ingest(self):
+        """Read and map the export and save it as filled_0_1; returns the ingest frame."""
+        with stage("generate_data.ingest") as record:
+            filled_df = self.load_completion_data()
+            record.rows_in = record.rows_out = len(filled_df)
+            processed_file = self.save_output(filled_df.drop(columns=[MONTH_KEY]), "filled_0_1.csv", index=False)
+        print(f"Processed completion data saved as: {processed_file}")
+        return filled_df
+
+    def save_pivot(self, pivot_df):
+        pivot_table_file = self.save_output(pivot_df, "Completed_Forms_Pivot.csv", float_format='%.0f')
+        print(f"Pivot table saved as: {pivot_table_file}")
+        return pivot_table_file
+
+    def pivot(self, filled_df, year_to_analyze=None):
+        """Count filled forms per site and KPI category and save the pivot; returns it."""
+        with stage("generate_data.pivot", rows_in=len(filled_df)) as record:
+            pivot_df = self.build_pivot_table(filled_df, year=year_to_analyze)
+            record.rows_out = len(pivot_df)
+            self.save_pivot(pivot_df)
+        return pivot_df
+
+    def completion_rates(self, pivot_df, current_month=None, year_to_analyze=None):
+        """Turn the pivot into completion rates per site and save them; returns the rates."""
+        with stage("generate_data.completion_rates", rows_in=len(pivot_df)) as record:
+            # The CSV round trip turns the pivot index into the first column
+            rates_df = self.build_completion_rates(pivot_df.reset_index(), current_month=current_month, year_to_analyze=year_to_analyze)
+            record.rows_out = len(rates_df)
+            final_output_file = self.save_output(rates_df, "completion_rates_with_activity_region.csv", export_csv=True, index=False, float_format='%.2f')
+        print(f"Completion rates saved as: {final_output_file}")
+        return rates_df
+
+    def run_frames(self, year_to_analyze=None, current_month=None, on_chunk=None):
+        """Run ingest, pivot and completion rates, handing the DataFrames from one stage to the next.
+
+        Every artifact is still written to the output folder for the dashboard pages,
+        it is just never read back. Returns the frames keyed by stage. With a chunksize
+        the export is streamed instead and `on_chunk` is called with every ingest chunk.
+        """
+        if self.chunksize:
+            frames = self.stream_completion_data(year_to_analyze=year_to_analyze, on_chunk=on_chunk)
+            self.save_pivot(frames["pivot"])
+        else:
+            filled_df = self.ingest()
+            frames = {"filled": filled_df, "sites": site_countries(filled_df),
+                      "pivot": self.pivot(filled_df, year_to_analyze=year_to_analyze)}
+        frames["completion_rates"] = self.completion_rates(
+            frames["pivot"], current_month=current_month, year_to_analyze=year_to_analyze
+        )
+        return frames
+
+    def stream_completion_data(self, year_to_analyze=None, on_chunk=None):
+        """Map, filter and count the export chunk by chunk so memory is bounded by the chunk size.
+
+        filled_0_1 is written as the chunks go by; only the pivot counts and the
+        Site -> country lookup are kept.
+        """
+        if not os.path.exists(self.input_file):
+            raise FileNotFoundError(f"File not found: {self.input_file}")
+        counter = PivotCounter(year=year_to_analyze)
+        countries = {}
+        processed_file = os.path.join(self.output_folder, "filled_0_1.csv")
+        with stage("generate_data.stream_ingest") as record, \
+                ChunkedArtifactWriter(processed_file, index=False, dtypes=PROCESSED_DTYPES) as writer:
+            record.rows_in = 0
+            for chunk in read_completion_chunks(self.input_file, self.chunksize):
+                record.rows_in += len(chunk)
+                writer.write(chunk.drop(columns=[MONTH_KEY]))
+                counter.add(chunk)
+                for site, country in site_countries(chunk).itertuples(index=False, name=None):
+                    countries.setdefault(site, country)
+                if on_chunk:
+                    on_chunk(chunk)
+            pivot_df = counter.to_pivot()
+            record.rows_out = len(pivot_df)
+        print(f"Processed completion data saved as: {writer.path}")
+        sites_df = pd.DataFrame({'Site': list(countries), 'country': list(countries.values())})
+        return {"sites": sites_df, "pivot": pivot_df}
 
 # Plotting Functions (as before)
 def calculate_and_plot_region_completions(input_file):
@@ -132,6 +323,20 @@ def calculate_and_plot_region_completions(input_file):
 def calculate_and_plot_activity_completions(input_file):
     pass
 
+# Set STREAM_CHUNKSIZE (rows) to stream exports too large to load at once
+STREAM_CHUNKSIZE = int(os.environ.get("STREAM_CHUNKSIZE", "0")) or None
+# "full" re-reads the whole export on every run; "incremental" folds only new or
+# changed rows into the counts kept from the previous run (see pages/incremental.py)
+INGEST_MODE = os.environ.get("INGEST_MODE", "full")
+
+def create_tracker(chunksize=STREAM_CHUNKSIZE):
+    return DataImpactTracker(
+        input_file=os.path.join(INPUT_DIR, "Filled_not filled.csv"),
+        activity_region_file=os.path.join(INPUT_DIR, "Activity_Region_Category.csv"),
+        output_folder=OUTPUT_DIR,
+        chunksize=chunksize
+    )
+
 # Main Function
 def generate_all_data():
     # Read the parameters from the dashboard_parameters.txt file
@@ -142,11 +347,7 @@ def generate_all_data():
     current_month = parameters.get("current_month", 11)
 
     # Step 1: Run DataImpactTracker
-    tracker = DataImpactTracker(
-        input_file=os.path.join(INPUT_DIR, "Filled_not filled.csv"),
-        activity_region_file=os.path.join(INPUT_DIR, "Activity_Region_Category.csv"),
-        output_folder=OUTPUT_DIR
-    )
+    tracker = create_tracker()
     final_csv = tracker.run(year_to_analyze=year_to_analyze, current_month=current_month)
 
     # Step 2: Use the generated final CSV for further processing
@@ -0,0 +1,265 @@
+"""Incremental ingest: keep the completion counts between runs and fold in only what changed.
+
+The filled-form counts per site x KPI category x month (the completion cube)
+are additive, so a refresh only has to count the rows that are new or changed:
+
+- Appended rows: when the export still starts with exactly the bytes ingested
+  last time, only the bytes after that high-water mark are parsed and counted.
+- Rewritten export: the whole file is parsed, but each month carries a hash of
+  its rows, and only the months whose hash changed are recounted.
+
+Completion rates are then re-derived for the sites those rows belong to and
+spliced into the previous table. When something else the rates depend on
+changes (the analyzed period or the activity/region file) every site is
+re-derived. The state is kept in Input/.ingest_state, next to the inputs it
+describes, so it survives a new Output snapshot.
+"""
+import hashlib
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import record_read, stage
+from storage import artifact_exists, read_artifact, write_artifact
+from pages.cube import build_completion_cube, merge_cubes, pivot_as_of, save_completion_cube
+from pages.generate_data import (
+    INGEST_DTYPES, INPUT_DIR, MONTH_KEY, add_pivot_totals, apply_ingest_schema, read_completion_data,
+    site_countries,
+)
+
+STATE_DIR = os.path.join(INPUT_DIR, ".ingest_state")
+STATE_FILE = os.path.join(STATE_DIR, "state.json")
+CUBE_STATE_FILE = os.path.join(STATE_DIR, "completion_cube.csv")
+SITES_STATE_FILE = os.path.join(STATE_DIR, "sites.csv")
+RATES_STATE_FILE = os.path.join(STATE_DIR, "completion_rates.csv")
+# Bumped when the layout of the state changes; an older state is rebuilt from scratch
+STATE_VERSION = 1
+
+HASH_COLUMNS = list(INGEST_DTYPES)
+HASH_CHUNK_BYTES = 1 << 20
+
+
+def prefix_hash(path, length):
+    """sha256 object fed with the first `length` bytes of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while length > 0:
+            chunk = f.read(min(HASH_CHUNK_BYTES, length))
+            if not chunk:
+                break
+            digest.update(chunk)
+            length -= len(chunk)
+    return digest
+
+
+def file_version(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def month_signatures(df):
+    """{month key: [sum of the row hashes, rows]} of an ingest frame.
+
+    The sum does not depend on row order and two signatures can be added, so
+    appended rows update a month's signature without rehashing the month.
+    """
+    if df.empty:
+        return {}
+    hashes = pd.util.hash_pandas_object(df[HASH_COLUMNS], index=False).to_numpy()
+    keys = df[MONTH_KEY].to_numpy()
+    order = np.argsort(keys, kind="stable")
+    months, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+    # uint64 sums wrap around, which keeps them exact modulo 2**64
+    sums = np.add.reduceat(hashes[order], starts)
+    return {str(month): [str(total), int(rows)] for month, total, rows in zip(months, sums, counts)}
+
+
+def add_signatures(left, right):
+    merged = dict(left)
+    for month, (total, rows) in right.items():
+        old_total, old_rows = merged.get(month, ["0", 0])
+        merged[month] = [str((int(old_total) + int(total)) % 2 ** 64), old_rows + rows]
+    return merged
+
+
+def load_state():
+    """The state of the previous run, or None when there is none (or it is unusable)."""
+    try:
+        with open(STATE_FILE, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get("version") != STATE_VERSION:
+        return None
+    if not all(artifact_exists(path) for path in (CUBE_STATE_FILE, SITES_STATE_FILE, RATES_STATE_FILE)):
+        return None
+    return state
+
+
+def save_state(state, cube, sites_df, rates_df):
+    os.makedirs(STATE_DIR, exist_ok=True)
+    write_artifact(cube, CUBE_STATE_FILE, index=False)
+    write_artifact(sites_df, SITES_STATE_FILE, index=False)
+    write_artifact(rates_df, RATES_STATE_FILE, index=False)
+    # Written last: the artifacts above are only trusted once the state file points at them
+    tmp_file = STATE_FILE + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_file, STATE_FILE)
+
+
+def read_appended_rows(input_file, offset, size):
+    """Parse the complete lines between byte `offset` and `size`; returns (rows, their bytes)."""
+    with open(input_file, "rb") as f:
+        header = f.readline()
+        f.seek(offset)
+        tail = f.read(size - offset)
+    # A line still being written is left for the next run
+    tail = tail[:tail.rfind(b"\n") + 1]
+    record_read(input_file)
+    df = pd.read_csv(io.BytesIO(header + tail), dtype=INGEST_DTYPES)
+    return apply_ingest_schema(df), tail
+
+
+def ends_with_newline(path, size):
+    if size == 0:
+        return False
+    with open(path, "rb") as f:
+        f.seek(size - 1)
+        return f.read(1) == b"\n"
+
+
+def ingest_changes(input_file, state):
+    """Fold the new or changed rows of the export into the counts of `state`.
+
+    Returns (cube, sites_df, affected sites or None for all, new file state).
+    """
+    size, mtime = file_version(input_file)
+    digest = None
+    if state and state["file"]["appendable"] and size >= state["file"]["bytes"]:
+        digest = prefix_hash(input_file, state["file"]["bytes"])
+    if digest is not None and digest.hexdigest() == state["file"]["prefix_sha256"]:
+        cube = read_artifact(CUBE_STATE_FILE)
+        sites_df = read_artifact(SITES_STATE_FILE)
+        if size == state["file"]["bytes"]:
+            print("Incremental ingest: the export has no new rows.")
+            return cube, sites_df, [], state["file"]
+        with stage("incremental.append") as record:
+            delta, tail = read_appended_rows(input_file, state["file"]["bytes"], size)
+            record.rows_in = record.rows_out = len(delta)
+            cube = merge_cubes(cube, build_completion_cube(delta))
+            sites_df = pd.concat([sites_df, site_countries(delta)]).astype(object).drop_duplicates(subset='Site')
+        print(f"Incremental ingest: {len(delta):,} rows appended since the last run.")
+        digest.update(tail)
+        file_state = {
+            "bytes": state["file"]["bytes"] + len(tail),
+            "prefix_sha256": digest.hexdigest(),
+            "appendable": True,
+            "months": add_signatures(state["file"]["months"], month_signatures(delta)),
+        }
+        return cube, sites_df, delta['Site'].unique().tolist(), file_state
+
+    with stage("incremental.rescan") as record:
+        df = read_completion_data(input_file)
+        if file_version(input_file) != (size, mtime):
+            raise RuntimeError(f"{input_file} changed while it was read; run again once it is complete")
+        record.rows_in = len(df)
+        months = month_signatures(df)
+        sites_df = site_countries(df).astype(object)
+        if state is None:
+            changed = set(months)
+            cube, affected = build_completion_cube(df), None
+        else:
+            old_months = state["file"]["months"]
+            changed = {m for m in set(months) | set(old_months) if months.get(m) != old_months.get(m)}
+            cube = read_artifact(CUBE_STATE_FILE)
+            month_keys = cube['Year'].astype('int32') * 100 + cube['Month']
+            stale = month_keys.isin([int(m) for m in changed])
+            recount = df[df[MONTH_KEY].isin([int(m) for m in changed])]
+            record.rows_out = len(recount)
+            affected = set(cube.loc[stale, 'Site'].astype(object)) | set(recount['Site'].astype(object))
+            cube = merge_cubes(cube[~stale], build_completion_cube(recount))
+            affected = sorted(affected)
+    print(f"Incremental ingest: export rescanned, {len(changed)} of {len(months)} months changed.")
+    file_state = {
+        "bytes": size,
+        "prefix_sha256": prefix_hash(input_file, size).hexdigest(),
+        "appendable": ends_with_newline(input_file, size),
+        "months": months,
+    }
+    return cube, sites_df, affected, file_state
+
+
+def derive_rates(tracker, pivot, previous_rates, affected, year, month, activity_region_df):
+    """Completion rates for the `affected` sites spliced into `previous_rates` (all sites if None)."""
+    if affected is None or previous_rates is None:
+        return tracker.build_completion_rates(
+            pivot.reset_index(), current_month=month, year_to_analyze=year, activity_region_df=activity_region_df
+        )
+    if not affected:
+        return previous_rates
+    updated = tracker.build_completion_rates(
+        pivot[pivot.index.isin(affected)].reset_index(), current_month=month, year_to_analyze=year,
+        activity_region_df=activity_region_df[activity_region_df['Location'].isin(affected)],
+    )
+    kept = previous_rates[~previous_rates['Location'].isin(affected)]
+    # An empty join can come back with object columns; keep the dtypes of the full table
+    rates = pd.concat([kept, updated], ignore_index=True).astype(previous_rates.dtypes.to_dict())
+    return rates.sort_values(by="Location")
+
+
+def run_incremental(tracker, year_to_analyze=None, current_month=None):
+    """Same frames and artifacts as DataImpactTracker.run_frames, from the delta of the export.
+
+    The completion cube is written to Output/ as well, for the as-of selector.
+
+    filled_0_1 (the row-level copy of the export) is not rewritten, since that
+    would cost as much as a full run, so a copy left by an earlier full run is
+    stale; the pipeline only needs the cube and the sites.
+    """
+    if not year_to_analyze:
+        raise ValueError("Incremental ingest needs year_to_analyze")
+    if not os.path.exists(tracker.input_file):
+        raise FileNotFoundError(f"File not found: {tracker.input_file}")
+    if not os.path.exists(tracker.activity_region_file):
+        raise FileNotFoundError("Required input files are missing.")
+
+    state = load_state()
+    cube, sites_df, affected, file_state = ingest_changes(tracker.input_file, state)
+    # The kept cube with the changed months folded in is also the dashboard's completion cube
+    save_completion_cube(cube)
+
+    activity_size = os.path.getsize(tracker.activity_region_file)
+    inputs = {
+        "period": [year_to_analyze, current_month],
+        "activity_sha256": prefix_hash(tracker.activity_region_file, activity_size).hexdigest(),
+    }
+    previous_rates = None
+    if state and state["inputs"] == inputs:
+        previous_rates = read_artifact(RATES_STATE_FILE)
+    elif state:
+        print("Incremental ingest: the period or activity file changed, re-deriving every site.")
+
+    with stage("generate_data.completion_rates") as record:
+        # Same year filter as the full pivot: every month of the analyzed year
+        count_df = pivot_as_of(cube, year_to_analyze, 12)
+        pivot_df = add_pivot_totals(count_df)
+        record.rows_in = len(pivot_df)
+        pivot_table_file = tracker.save_output(pivot_df, "Completed_Forms_Pivot.csv", float_format='%.0f')
+        print(f"Pivot table saved as: {pivot_table_file}")
+
+        activity_region_df = pd.read_csv(tracker.activity_region_file)
+        rates_df = derive_rates(tracker, count_df, previous_rates, affected, year_to_analyze, current_month,
+                                activity_region_df)
+        record.rows_out = len(rates_df)
+        final_output_file = tracker.save_output(rates_df, "completion_rates_with_activity_region.csv",
+                                                export_csv=True, index=False, float_format='%.2f')
+    print(f"Completion rates saved as: {final_output_file}")
+    if affected is not None and previous_rates is not None:
+        print(f"Completion rates re-derived for {len(affected):,} affected sites.")
+
+    save_state({"version": STATE_VERSION, "file": file_state, "inputs": inputs}, cube, sites_df, rates_df)
+    return {"cube": cube, "sites": sites_df, "pivot": pivot_df, "completion_rates": rates_df}
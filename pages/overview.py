@@ -1,28 +1,101 @@
 import os
-from dash import dcc, html
+from dash import dash_table, dcc, html
+from dash.dash_table.Format import Format, Scheme, Symbol
 from utils import Header  # Assuming the Header utility exists
+from data_context import DataContext
+from site_table import (
+    DISPLAY_COLUMNS, FILTER_COLUMNS, PAGE_SIZE, RATE_COLUMNS, SITE_TABLE_FILE, database_filter_options, filter_options,
+)
+from storage import artifact_exists
+import database
 
 # Define the folder path where your HTML plots are stored
 PLOTS_DIR = "Output/Assets"
 
+# "server" filters, sorts and pages the site table in a callback; "html" embeds the DataTables export
+SITE_TABLE_MODE = os.environ.get("SITE_TABLE_MODE", "server")
+
+# Files the layout is built from (see layout_cache)
+if SITE_TABLE_MODE == "server":
+    SOURCE_FILES = [SITE_TABLE_FILE]
+else:
+    SOURCE_FILES = [os.path.join(PLOTS_DIR, "filterable_data_table.html")]
+
 # Function to read and return HTML content from files
-def get_iframe_src(file_name):
+def get_iframe_src(file_name, context):
     """Reads the HTML file and returns its content or an error message if not found."""
     file_path = os.path.join(PLOTS_DIR, file_name)
-    if os.path.exists(file_path):
-        try:
-            with open(file_path, "r", encoding="utf-8") as file:
-                return file.read()
-        except UnicodeDecodeError:
-            with open(file_path, "r", encoding="latin-1") as file:
-                return file.read()
-    else:
+    content = context.html(file_path)
+    if content is None:
         return f"<h3>Error: File {file_name} not found in {PLOTS_DIR}.</h3>"
+    return content
+
+# Filterable site table; rows are fetched page by page by app.update_site_table
+def create_site_table(context):
+    if not artifact_exists(SITE_TABLE_FILE):
+        return html.H3(f"Error: File {SITE_TABLE_FILE} not found.")
+    if database.available():
+        options = database_filter_options()
+    else:
+        options = filter_options(context.table(SITE_TABLE_FILE))
+
+    filters = [
+        html.Div(
+            [
+                html.Label(f"{column[0].upper()}{column[1:]}:"),
+                dcc.Dropdown(
+                    id=f"site-filter-{suffix}",
+                    options=[{"label": str(value), "value": value} for value in options[column]],
+                    multi=True,
+                    placeholder="All",
+                ),
+            ],
+            style={"width": "220px", "display": "inline-block", "margin-right": "10px"},
+        )
+        for column, suffix in FILTER_COLUMNS.items()
+    ]
+    rate_format = Format(precision=0, scheme=Scheme.fixed, symbol=Symbol.yes, symbol_suffix="%")
+    columns = [
+        {"name": column, "id": column, "type": "numeric", "format": rate_format}
+        if column in RATE_COLUMNS else {"name": column, "id": column}
+        for column in DISPLAY_COLUMNS
+    ]
+    return html.Div(
+        [
+            html.Div(filters, className="filter-container"),
+            html.P(id="site-table-count"),
+            dash_table.DataTable(
+                id="site-table",
+                columns=columns,
+                page_current=0,
+                page_size=PAGE_SIZE,
+                page_action="custom",
+                sort_action="custom",
+                sort_mode="multi",
+                sort_by=[],
+                style_table={"overflowX": "auto"},
+                style_cell={"textAlign": "left", "padding": "5px"},
+            ),
+        ],
+        style={"padding": "10px"},
+    )
 
 # Create the layout for the Overview page
-def create_layout(app):
-    # Fetch the HTML content for the filterable data table
-    table_html = get_iframe_src("filterable_data_table.html")
+def create_layout(app, context=None):
+    context = context or DataContext()
+    if SITE_TABLE_MODE == "server":
+        table = create_site_table(context)
+    else:
+        # Fetch the HTML content for the filterable data table
+        table_html = get_iframe_src("filterable_data_table.html", context)
+        table = html.Iframe(
+            srcDoc=table_html,  # Display the HTML content in an Iframe
+            style={
+                "width": "100%",  # Full width
+                "height": "calc(100vh - 60px)",  # Adjust height to fit the viewport minus the header
+                "border": "none",
+            },
+        )
 
     return html.Div(
         [
@@ -32,18 +105,9 @@ def create_layout(app):
             # Main content container
             html.Div(
                 [
-                    # Row 1 - Full-page Iframe (Filterable Data Table)
+                    # Row 1 - Filterable Data Table
                     html.Div(
-                        [
-                            html.Iframe(
-                                srcDoc=table_html,  # Display the HTML content in an Iframe
-                                style={
-                                    "width": "100%",  # Full width
-                                    "height": "calc(100vh - 60px)",  # Adjust height to fit the viewport minus the header
-                                    "border": "none",
-                                },
-                            ),
-                        ],
+                        [table],
                         className="row",
                         style={
                             "width": "100%",
@@ -62,6 +126,6 @@ def create_layout(app):
             "height": "100vh",  # Full viewport height
             "padding": "0",
             "margin": "0",
-            "overflow": "hidden",  # Prevent scrolling
+            "overflow": "auto" if SITE_TABLE_MODE == "server" else "hidden",  # The iframe scrolls itself
         },
     )
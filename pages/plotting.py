@@ -1,40 +1,69 @@
 import pandas as pd
+import multiprocessing
 import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 import plotly.graph_objects as go
 import plotly.express as px
+import plotly.offline
+
+from storage import load_frame, write_artifact
+from instrumentation import SAMPLER_THREAD_NAME, record_write
+from aggregations import ACTIVITY_CLASS_ORDER, KPI_COLUMNS, completion_rollups
 
 # Define the directory for saving plots globally
 PLOTS_DIR = "Output/Assets"
 os.makedirs(PLOTS_DIR, exist_ok=True)
 
-def preprocess_columns(df, columns):
-    """Helper function to preprocess columns by removing '%' and converting to float."""
-    for column in columns:
-        if column in df.columns:
-            df[column] = df[column].str.replace('%', '').astype(float)
-        else:
-            print(f"Warning: Column '{column}' not found in data.")
-    return df
+# "local" makes every figure load one shared plotly.js served by the app at PLOTLYJS_URL_PREFIX
+# (no CDN, we run offline); "inline" embeds the full library in each HTML file as before
+PLOTLYJS_MODE = os.environ.get("PLOTLYJS_MODE", "local")
+PLOTLYJS_URL_PREFIX = "/figure-assets/"
+# Versioned name so browsers can cache it for good
+PLOTLYJS_FILE = f"plotly-{plotly.offline.get_plotlyjs_version()}.min.js"
+
+# Figures written by generate_all_plots, each as .html and .json in PLOTS_DIR
+FIGURE_NAMES = [
+    "average_completion_rates_by_region_without_grand_total",
+    "average_completion_rates_by_region_heatmap",
+    "grand_total_map",
+    "comparison_of_IST_IPS_ISI",
+]
+
+# Processes used to build figures concurrently; PLOT_WORKERS=1 builds them one after another
+PLOT_WORKERS = int(os.environ.get("PLOT_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+
+def ensure_plotlyjs():
+    """Write the plotly.js bundle next to the figures once; returns its path."""
+    path = os.path.join(PLOTS_DIR, PLOTLYJS_FILE)
+    if not os.path.exists(path):
+        # Figures may be built in parallel, so publish the file atomically
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(plotly.offline.get_plotlyjs())
+        os.replace(tmp_path, path)
+    return path
+
+def write_figure(fig, plot_path):
+    """Save a figure as HTML, referencing the shared plotly.js unless PLOTLYJS_MODE is inline.
+
+    The figure is also saved as plotly JSON next to it for the pages to render with dcc.Graph.
+    """
+    if PLOTLYJS_MODE == "inline":
+        fig.write_html(plot_path)
+    else:
+        ensure_plotlyjs()
+        fig.write_html(plot_path, include_plotlyjs=PLOTLYJS_URL_PREFIX + PLOTLYJS_FILE)
+    fig.write_json(os.path.splitext(plot_path)[0] + ".json")
+    record_write(plot_path)
+    record_write(os.path.splitext(plot_path)[0] + ".json")
 
 def calculate_and_plot_region_completions(input_file):
-    df = pd.read_csv(input_file)
-    df = preprocess_columns(df, ['Environment', 'Health & Safety', 'Social'])
-    
-    regions = ['EUROPE', 'LATAM', 'MEA', 'APAC', 'NORAM']
-    avg_completions = []
-
-    # Calculate average completion rates per region
-    for region in regions:
-        df_region = df[df['Region'] == region]
-        if not df_region.empty:
-            avg_completions.append({
-                'Region': region,
-                'Environment': df_region['Environment'].mean(skipna=True),
-                'Health & Safety': df_region['Health & Safety'].mean(skipna=True),
-                'Social': df_region['Social'].mean(skipna=True)
-            })
-
-    avg_df = pd.DataFrame(avg_completions).set_index('Region')
+    df = load_frame(input_file)
+
+    # Average completion rates per region
+    avg_df = completion_rollups(df)["region"][KPI_COLUMNS]
     plot_avg_completion_rates(avg_df, "average_completion_rates_by_region_without_grand_total.html")
 
 def plot_avg_completion_rates(df, filename):
@@ -72,28 +101,13 @@ def plot_avg_completion_rates(df, filename):
 
     # Save the interactive plot to an HTML file
     plot_path = os.path.join(PLOTS_DIR, filename)
-    fig.write_html(plot_path)
+    write_figure(fig, plot_path)
     print(f"Interactive Plot saved to: {plot_path}")
 
 def calculate_and_plot_region_completions_heatmap(input_file):
-    df = pd.read_csv(input_file)
-    df = preprocess_columns(df, ['Environment', 'Health & Safety', 'Social', 'Grand Total'])
-
-    regions = ['EUROPE', 'LATAM', 'MEA', 'APAC', 'NORAM']
-    avg_completions = []
-
-    for region in regions:
-        df_region = df[df['Region'] == region]
-        if not df_region.empty:
-            avg_completions.append({
-                'Region': region,
-                'Environment': df_region['Environment'].mean(skipna=True),
-                'Health & Safety': df_region['Health & Safety'].mean(skipna=True),
-                'Social': df_region['Social'].mean(skipna=True),
-                'Grand Total': df_region['Grand Total'].mean(skipna=True)
-            })
-
-    avg_df = pd.DataFrame(avg_completions).set_index('Region')
+    df = load_frame(input_file)
+
+    avg_df = completion_rollups(df)["region"]
     plot_avg_completion_rates_heatmap(avg_df)
 
 def plot_avg_completion_rates_heatmap(df):
@@ -108,38 +122,19 @@ def plot_avg_completion_rates_heatmap(df):
                     color_continuous_scale=blue_grey_scale, aspect='auto')
 
     plot_path = os.path.join(PLOTS_DIR, "average_completion_rates_by_region_heatmap.html")
-    fig.write_html(plot_path)
+    write_figure(fig, plot_path)
     print(f"Interactive Heatmap saved to: {plot_path}")
 
-def add_country_to_completion_data(location_file, completion_file, output_file):
-    location_df = pd.read_csv(location_file)
-    completion_df = pd.read_csv(completion_file)
-
-    location_df['country'] = location_df['country'].replace({
-        'UAE': 'United Arab Emirates',  # Add mappings as needed
-    })
-    
-    completion_df['Location'] = completion_df['Location'].replace({
-        'Abu Dhabi': 'Abu Dhabi',  # Normalize location names
-    })
-
-    merged_df = pd.merge(completion_df, location_df[['Site', 'country']], left_on='Location', right_on='Site', how='left')
-    merged_df = merged_df.drop_duplicates(subset='Location')
-    
-    merged_df.to_csv(output_file, index=False)
-    print(f"Updated file saved to: {output_file}")
-
 def calculate_average_completion_per_country(input_file, output_file):
-    df = pd.read_csv(input_file)
-    df = preprocess_columns(df, ['Environment', 'Health & Safety', 'Social', 'Grand Total'])
+    df = load_frame(input_file)
     
-    avg_completions_per_country = df.groupby('country')[['Environment', 'Health & Safety', 'Social', 'Grand Total']].mean()
-    avg_completions_per_country.to_csv(output_file)
+    avg_completions_per_country = completion_rollups(df)["country"]
+    write_artifact(avg_completions_per_country, output_file, export_csv=True, float_format='%.2f')
     print(f"Average completion rates per country saved to: {output_file}")
+    return avg_completions_per_country.reset_index()
 
 def plot_grand_total_map(input_file):
-    df = pd.read_csv(input_file)
-    df['Grand Total'] = df['Grand Total'].astype(float)
+    df = load_frame(input_file)
 
     # Create the choropleth map
     fig = px.choropleth(df, 
@@ -167,30 +162,25 @@ def plot_grand_total_map(input_file):
 
     # Save the interactive map to an HTML file
     plot_path = os.path.join(PLOTS_DIR, "grand_total_map.html")
-    fig.write_html(plot_path)
+    write_figure(fig, plot_path)
     print(f"Interactive map saved to: {plot_path}")
 
 def calculate_and_plot_activity_completions(input_file):
     """Create a bar chart comparing IST vs IPS vs ISI for each KPI (Environment, Health & Safety, Social)."""
     # Load the data
-    df = pd.read_csv(input_file)
-    
-    # Clean up the data by removing '%' and converting to float
-    df = preprocess_columns(df, ['Environment', 'Health & Safety', 'Social', 'Grand Total'])
-    
-    # Calculate the average completion rates for IST, IPS, and ISI for each KPI
-    avg_ist = df[df['Activity'] == 'IST'][['Environment', 'Health & Safety', 'Social']].mean()
-    avg_ips = df[df['Activity'] == 'IPS'][['Environment', 'Health & Safety', 'Social']].mean()
-    
-    # Calculate ISI: Anything that is not IST or IPS
-    df_isi = df[~df['Activity'].isin(['IST', 'IPS'])]  
-    avg_isi = df_isi[['Environment', 'Health & Safety', 'Social']].mean()
+    df = load_frame(input_file)
+
+    # Average completion rates for IST, IPS and ISI (anything that is not IST or IPS)
+    plot_activity_completions(completion_rollups(df)["activity_class"])
 
+def plot_activity_completions(avg_df):
+    """Bar chart of the per-activity-class averages from completion_rollups."""
     # Prepare the data for the bar chart
-    kpis = ['Environment', 'Health & Safety', 'Social']
-    ist_values = [avg_ist[kpi] for kpi in kpis]
-    ips_values = [avg_ips[kpi] for kpi in kpis]
-    isi_values = [avg_isi[kpi] for kpi in kpis]
+    kpis = KPI_COLUMNS
+    avg_df = avg_df.reindex(ACTIVITY_CLASS_ORDER)
+    ist_values = avg_df.loc['IST', kpis].tolist()
+    ips_values = avg_df.loc['IPS', kpis].tolist()
+    isi_values = avg_df.loc['ISI', kpis].tolist()
 
     # Define custom colors for IST, IPS, and ISI
     colors = {
@@ -242,18 +232,98 @@ def calculate_and_plot_activity_completions(input_file):
 
     # Save the plot as an interactive HTML file
     plot_path = os.path.join(PLOTS_DIR, "comparison_of_IST_IPS_ISI.html")
-    fig.write_html(plot_path)
+    write_figure(fig, plot_path)
     print(f"Interactive Plot saved to: {plot_path}")
 
-# Example usage
-input_file = "Output/completion_rates_with_activity_region.csv"
-location_file = "Output/filled_0_1.csv"
-completion_file = "Output/completion_rates_with_activity_region.csv"
-output_file = "Output/average_completion_rates_per_country.csv"
-
-calculate_and_plot_region_completions(input_file)
-calculate_and_plot_region_completions_heatmap(input_file)
-add_country_to_completion_data(location_file, completion_file, output_file)
-calculate_average_completion_per_country(output_file, "Output/average_completion_rates_per_country.csv")
-plot_grand_total_map("Output/average_completion_rates_per_country.csv")
-calculate_and_plot_activity_completions(input_file)
+def timed_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def pool_context():
+    """Start figure workers with spawn when other threads are running, e.g. inside the dashboard.
+
+    A forked child gets copies of locks other threads may hold; spawn starts a
+    clean interpreter instead. It costs a few seconds of imports per build, so a
+    single-threaded preprocess run keeps the platform default.
+    """
+    others = [thread for thread in threading.enumerate()
+              if thread is not threading.current_thread() and thread.name != SAMPLER_THREAD_NAME]
+    if others:
+        return multiprocessing.get_context("spawn")
+    return multiprocessing.get_context()
+
+def run_figure_tasks(tasks, dependents, max_workers):
+    """Run independent figure tasks concurrently and return the wall time of each.
+
+    `tasks` maps a name to (function, *args). `dependents` maps a task name to a
+    (name, function) that is started with that task's result once it finishes.
+    """
+    timings = {}
+    if max_workers <= 1:
+        for name, (func, *args) in tasks.items():
+            result, timings[name] = timed_call(func, *args)
+            if name in dependents:
+                dependent_name, dependent_func = dependents[name]
+                _, timings[dependent_name] = timed_call(dependent_func, result)
+        return timings
+
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=pool_context()) as pool:
+        pending = {pool.submit(timed_call, func, *args): name for name, (func, *args) in tasks.items()}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                result, timings[name] = future.result()
+                if name in dependents:
+                    dependent_name, dependent_func = dependents[name]
+                    pending[pool.submit(timed_call, dependent_func, result)] = dependent_name
+    return timings
+
+def figure_outputs():
+    """Every file generate_all_plots writes into PLOTS_DIR."""
+    paths = [os.path.join(PLOTS_DIR, name + ext) for name in FIGURE_NAMES for ext in (".html", ".json")]
+    if PLOTLYJS_MODE != "inline":
+        paths.append(os.path.join(PLOTS_DIR, PLOTLYJS_FILE))
+    return paths
+
+def generate_all_plots(input_file, country_file, output_file, max_workers=None):
+    """Build every figure; each source may be a CSV path or an already loaded DataFrame.
+
+    `input_file` holds the completion rates and `country_file` the same rates with
+    countries (table.add_country_to_completion_data), which the country averages
+    written to `output_file` are taken from. The shared inputs are loaded once and
+    the independent figures are built in a process pool. The map only starts once
+    the country averages it shows are ready. Returns the wall time per figure.
+    """
+    max_workers = PLOT_WORKERS if max_workers is None else max_workers
+    start = time.perf_counter()
+    if PLOTLYJS_MODE != "inline":
+        ensure_plotlyjs()
+    df = load_frame(input_file)
+    country_df = load_frame(country_file)
+    # One aggregation pass here; the figure tasks only receive the small rollups
+    rollups = completion_rollups(df)
+
+    tasks = {
+        "region_bar_chart": (plot_avg_completion_rates, rollups["region"][KPI_COLUMNS],
+                             "average_completion_rates_by_region_without_grand_total.html"),
+        "region_heatmap": (plot_avg_completion_rates_heatmap, rollups["region"]),
+        "country_averages": (calculate_average_completion_per_country, country_df, output_file),
+        "activity_comparison": (plot_activity_completions, rollups["activity_class"]),
+    }
+    dependents = {"country_averages": ("grand_total_map", plot_grand_total_map)}
+    timings = run_figure_tasks(tasks, dependents, max_workers)
+
+    for name, seconds in timings.items():
+        print(f"  {name}: {seconds:.2f}s")
+    print(f"Figures built in {time.perf_counter() - start:.2f}s with {max_workers} worker(s)")
+    return timings
+
+if __name__ == "__main__":
+    # Example usage
+    input_file = "Output/completion_rates_with_activity_region.csv"
+    country_file = "Output/completion_rates_with_activity_region_with_country.csv"
+    output_file = "Output/average_completion_rates_per_country.csv"
+
+    generate_all_plots(input_file, country_file, output_file)
@@ -1,24 +1,30 @@
 import os
 from dash import dcc, html
 from utils import Header
+from data_context import DataContext
 
 # Define constants for paths
 ASSETS_DIR = os.path.join("Output", "Assets")  # Custom directory for assets
 PLOT_FILE_HEATMAP = os.path.join(ASSETS_DIR, "average_completion_rates_by_region_heatmap.html")
 PLOT_FILE_BARCHART = os.path.join(ASSETS_DIR, "average_completion_rates_by_region_without_grand_total.html")
+# Files the layout is built from (see layout_cache)
+SOURCE_FILES = [PLOT_FILE_HEATMAP, PLOT_FILE_BARCHART]
 
 # Function to render a plot from an existing HTML file
-def render_plot_from_file(plot_file):
-    if not os.path.exists(plot_file):
+def render_plot_from_file(plot_file, context):
+    # Render natively from the cached figure JSON when the plotting stage produced one
+    figure = context.figure(plot_file)
+    if figure is not None:
+        return html.Div([dcc.Graph(figure=figure, style={"width": "100%", "height": "600px"})])
+
+    # Load the plot directly from the specified path
+    plot_html = context.html(plot_file)
+    if plot_html is None:
         return html.Div(
             f"Error: Plot file not found at {plot_file}.",
             style={"color": "red", "font-size": "16px", "text-align": "center"},
         )
 
-    # Load the plot directly from the specified path
-    with open(plot_file, "r", encoding="utf-8") as file:
-        plot_html = file.read()
-
     return html.Div(
         [
             html.Iframe(
@@ -29,7 +35,8 @@ def render_plot_from_file(plot_file):
     )
 
 # Main layout function
-def create_layout(app):
+def create_layout(app, context=None):
+    context = context or DataContext()
     return html.Div(
         children=[
             Header(app),  # Use the Header from utils
@@ -41,7 +48,7 @@ def create_layout(app):
                             html.Div(
                                 [
                                     html.H6("Average Completion Rates by Region (Heatmap)", className="subtitle padded"),
-                                    render_plot_from_file(PLOT_FILE_HEATMAP),
+                                    render_plot_from_file(PLOT_FILE_HEATMAP, context),
                                 ],
                                 className="row",
                                 style={"width": "100%"},
@@ -50,7 +57,7 @@ def create_layout(app):
                             html.Div(
                                 [
                                     html.H6("Average Completion Rates by Region (Bar Chart)", className="subtitle padded"),
-                                    render_plot_from_file(PLOT_FILE_BARCHART),
+                                    render_plot_from_file(PLOT_FILE_BARCHART, context),
                                 ],
                                 className="row",
                                 style={"width": "100%"},
@@ -2,51 +2,51 @@ import os
 import pandas as pd
 from dash import dcc, html
 from utils import Header
+from data_context import DataContext
+from storage import artifact_exists
+from aggregations import ACTIVITY_CLASS_ORDER, KPI_COLUMNS
 
 # Define constants for paths
 OUTPUT_ASSETS_DIR = "Output/Assets"
 PLOT_FILE = os.path.join(OUTPUT_ASSETS_DIR, "comparison_of_IST_IPS_ISI.html")
 CSV_FILE = "Output/completion_rates_with_activity_region.csv"
+# Files the layout is built from (see layout_cache)
+SOURCE_FILES = [PLOT_FILE, CSV_FILE]
 
 # Load and process data for the KPI table
-def get_kpi_completion_data():
-    if not os.path.exists(CSV_FILE):
+def get_kpi_completion_data(context):
+    if not artifact_exists(CSV_FILE):
         raise FileNotFoundError(f"CSV file not found at path: {CSV_FILE}")
 
-    df = pd.read_csv(CSV_FILE)
-
-    # Preprocess columns (remove '%' and convert to float)
-    for col in ['Environment', 'Health & Safety', 'Social']:
-        df[col] = df[col].str.replace('%', '', regex=False).astype(float)
-
     # Calculate averages for each activity
-    kpi_columns = ['Environment', 'Health & Safety', 'Social']
-    ist_data = df[df['Activity'] == 'IST'][kpi_columns].mean()
-    ips_data = df[df['Activity'] == 'IPS'][kpi_columns].mean()
-    isi_data = df[~df['Activity'].isin(['IST', 'IPS'])][kpi_columns].mean()
+    kpi_columns = KPI_COLUMNS
+    activity_averages = context.rollups()["activity_class"].reindex(ACTIVITY_CLASS_ORDER)
 
     # Create a DataFrame for table display
     table_data = pd.DataFrame({
         'KPI': kpi_columns,
-        'IST Completion Rate (%)': ist_data.values,
-        'IPS Completion Rate (%)': ips_data.values,
-        'ISI Completion Rate (%)': isi_data.values
+        'IST Completion Rate (%)': activity_averages.loc['IST', kpi_columns].to_numpy(),
+        'IPS Completion Rate (%)': activity_averages.loc['IPS', kpi_columns].to_numpy(),
+        'ISI Completion Rate (%)': activity_averages.loc['ISI', kpi_columns].to_numpy(),
     })
 
     return table_data.round(0)  # Round values to integers
 
 # Render the existing plot file
-def create_comparison_plot():
-    if not os.path.exists(PLOT_FILE):
+def create_comparison_plot(context):
+    # Render natively from the cached figure JSON when the plotting stage produced one
+    figure = context.figure(PLOT_FILE)
+    if figure is not None:
+        return html.Div([dcc.Graph(figure=figure, style={"width": "100%", "height": "500px"})])
+
+    # Load the plot directly from the specified path
+    plot_html = context.html(PLOT_FILE)
+    if plot_html is None:
         return html.Div(
             f"Error: Plot file not found at {PLOT_FILE}.",
             style={"color": "red", "font-size": "16px", "text-align": "center"},
         )
 
-    # Load the plot directly from the specified path
-    with open(PLOT_FILE, "r", encoding="utf-8") as file:
-        plot_html = file.read()
-
     return html.Div(
         [
             html.Iframe(
@@ -57,8 +57,8 @@ def create_comparison_plot():
     )
 
 # Create the table dynamically
-def create_kpi_table():
-    df = get_kpi_completion_data()
+def create_kpi_table(context):
+    df = get_kpi_completion_data(context)
 
     table_header = [html.Tr([html.Th(col) for col in df.columns])]
     table_body = [
@@ -73,7 +73,8 @@ def create_kpi_table():
     )
 
 # Main layout function
-def create_layout(app):
+def create_layout(app, context=None):
+    context = context or DataContext()
     # Set the background color to match the gray shade of the header
     background_color = "#F4F6F9"  # Color to match the header's gray background
 
@@ -88,7 +89,7 @@ def create_layout(app):
                             html.Div(
                                 [
                                     html.H6("KPI Comparison (IST, IPS, ISI)", className="subtitle padded"),
-                                    create_comparison_plot(),
+                                    create_comparison_plot(context),
                                 ],
                                 className="row",
                                 style={"width": "100%"}  # No flexbox applied here, just full width
@@ -97,7 +98,7 @@ def create_layout(app):
                             html.Div(
                                 [
                                     html.H6("KPI Completion Rates", className="subtitle padded"),
-                                    create_kpi_table(),
+                                    create_kpi_table(context),
                                 ],
                                 className="row",
                                 style={"width": "100%"}  # No flexbox applied here, just full width
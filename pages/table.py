@@ -1,32 +1,38 @@
 import pandas as pd
 import os
 
+from storage import load_frame, read_artifact, write_artifact
+from instrumentation import record_write
+from dimensions import build_dimensions, save_dimensions, site_country
+
 # Define file paths
 OUTPUT_DIR = "Output"
 PLOTS_DIR = os.path.join(OUTPUT_DIR, "Assets")
 os.makedirs(PLOTS_DIR, exist_ok=True)
 
-def add_country_to_completion_data(location_file, completion_file, output_file):
-    """Merge location-to-country mapping with completion data."""
-    location_df = pd.read_csv(location_file)
-    completion_df = pd.read_csv(completion_file)
+RATE_COLUMNS = ['Environment', 'Health & Safety', 'Social', 'Grand Total']
+
+def format_rate(value):
+    """Render a numeric completion rate as a whole percentage."""
+    return "NaN" if pd.isna(value) else f"{value:.0f}%"
 
-    location_df['country'] = location_df['country'].replace({
-        'UAE': 'United Arab Emirates',
-    })
-    completion_df['Location'] = completion_df['Location'].replace({
-        'Abu Dhabi': 'Abu Dhabi',
-    })
+def add_country_to_completion_data(dimensions, completion_file, output_file):
+    """Add each location's export Site and country, looked up through the site dimension."""
+    completion_df = load_frame(completion_file)
+    completion_df = completion_df.drop_duplicates(subset='Location')
 
-    merged_df = pd.merge(completion_df, location_df[['Site', 'country']], left_on='Location', right_on='Site', how='left')
-    merged_df = merged_df.drop_duplicates(subset='Location')
-    merged_df.to_csv(output_file, index=False)
+    countries, in_export = site_country(dimensions, completion_df['Location'])
+    completion_df['Site'] = completion_df['Location'].where(in_export)
+    completion_df['country'] = countries
+    write_artifact(completion_df, output_file, export_csv=True, index=False, float_format='%.2f')
     print(f"Updated file saved to: {output_file}")
+    return completion_df
 
 def generate_html_table(input_file):
     """Generate an interactive HTML table with filters."""
-    data = pd.read_csv(input_file)
-    html_table = data.to_html(classes='table table-striped', index=False)
+    data = load_frame(input_file)
+    formatters = {column: format_rate for column in RATE_COLUMNS if column in data.columns}
+    html_table = data.to_html(classes='table table-striped', index=False, formatters=formatters)
 
     activity_options = data['Activity'].unique().tolist()
     region_options = data['Region'].unique().tolist()
@@ -77,16 +83,25 @@ def generate_html_table(input_file):
     output_html_path = os.path.join(PLOTS_DIR, "filterable_data_table.html")
     with open(output_html_path, 'w') as f:
         f.write(html_content)
+    record_write(output_html_path)
     print(f"HTML table saved to: {output_html_path}")
+    return output_html_path
 
 if __name__ == "__main__":
+    from pages.generate_data import create_tracker, site_countries
+
     # Example file paths
     location_file = os.path.join(OUTPUT_DIR, "filled_0_1.csv")
     completion_file = os.path.join(OUTPUT_DIR, "completion_rates_with_activity_region.csv")
     output_file = os.path.join(OUTPUT_DIR, "completion_rates_with_activity_region_with_country.csv")
 
-    # Step 1: Add country data
-    add_country_to_completion_data(location_file, completion_file, output_file)
+    # Step 1: Build the dimension tables (plotting reads them back) and add country data
+    dimensions = build_dimensions(
+        site_countries(read_artifact(location_file, columns=['Site', 'country'])),
+        pd.read_csv(create_tracker().activity_region_file),
+    )
+    save_dimensions(dimensions)
+    add_country_to_completion_data(dimensions, completion_file, output_file)
 
     # Step 2: Generate HTML table with filters
     generate_html_table(output_file)
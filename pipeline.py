@@ -0,0 +1,303 @@
+"""In-process preprocessing pipeline, declared as a graph of named artifacts.
+
+Each Artifact lists the frames it needs from upstream artifacts, the input
+files and parameters it reads, the modules holding its code and the files it
+writes. Its fingerprint hashes all of these, with upstream artifacts counted by
+their own fingerprints. An artifact whose fingerprint matches the one recorded
+in Output/.artifacts.json, and whose files are all still there, is skipped. A
+run with unchanged inputs builds nothing, and changing current_month only
+rebuilds the completion rates and what is derived from them.
+
+Frames are handed from one artifact to the next in memory. The frames of a
+skipped artifact are only read back from its files when an artifact that needs
+them is rebuilt. PIPELINE_FORCE=1 rebuilds everything.
+"""
+import hashlib
+import json
+import os
+import sys
+
+import pandas as pd
+
+import database
+from dimensions import DIMENSION_FILES, build_dimensions, load_dimensions, save_dimensions
+from instrumentation import add_listener, remove_listener, stage
+from pages import cube, generate_data, incremental, table, plotting
+import storage
+from watcher import content_hash
+
+OUTPUT_DIR = "Output"
+MANIFEST_FILE = os.path.join(OUTPUT_DIR, ".artifacts.json")
+PIPELINE_FORCE = os.environ.get("PIPELINE_FORCE", "0") == "1"
+
+FILLED_FILE = os.path.join(OUTPUT_DIR, "filled_0_1.csv")
+PIVOT_FILE = os.path.join(OUTPUT_DIR, "Completed_Forms_Pivot.csv")
+RATES_FILE = os.path.join(OUTPUT_DIR, "completion_rates_with_activity_region.csv")
+COUNTRY_FILE = os.path.join(OUTPUT_DIR, "completion_rates_with_activity_region_with_country.csv")
+COUNTRY_AVERAGES_FILE = os.path.join(OUTPUT_DIR, "average_completion_rates_per_country.csv")
+SITE_TABLE_HTML = os.path.join(table.PLOTS_DIR, "filterable_data_table.html")
+
+# Parameters that change every artifact's files
+GLOBAL_PARAMETERS = ["intermediate_format", "export_csv"]
+
+
+class Artifact:
+    """One node of the graph.
+
+    `build(frames, parameters)` writes `outputs` and returns the frames named in
+    `produces`; `load()` reads those frames back from `outputs`.
+    """
+    def __init__(self, name, build, outputs, load=None, produces=(), requires=(), sources=(), parameters=(),
+                 modules=()):
+        self.name = name
+        self.build = build
+        self.outputs = outputs
+        self.load = load
+        self.produces = list(produces)
+        self.requires = list(requires)
+        self.sources = list(sources)
+        self.parameters = list(parameters)
+        self.modules = ["pipeline", *modules]
+
+
+def read_parameters(tracker):
+    dashboard = generate_data.read_dashboard_parameters(file_name="dashboard_parameters.txt")
+    return {
+        "year_to_analyze": dashboard.get("year_to_analyze", 2024),
+        "current_month": dashboard.get("current_month", 11),
+        "stream_chunksize": tracker.chunksize,
+        "intermediate_format": storage.INTERMEDIATE_FORMAT,
+        "export_csv": storage.EXPORT_CSV,
+        "plotlyjs_mode": plotting.PLOTLYJS_MODE,
+    }
+
+
+def load_cube():
+    return {"cube": storage.read_artifact(cube.CUBE_FILE)}
+
+
+def load_filled():
+    filled_df = generate_data.read_completion_data(FILLED_FILE, processed=True)
+    return {"filled": filled_df, "sites": generate_data.site_countries(filled_df)}
+
+
+def load_pivot():
+    pivot_df = storage.read_artifact(PIVOT_FILE)
+    return {"pivot": pivot_df.set_index(pivot_df.columns[0])}
+
+
+def artifact_graph(tracker):
+    """The artifacts for the configured ingest mode, in an order that builds producers first."""
+    export, activity = tracker.input_file, tracker.activity_region_file
+    year = "year_to_analyze"
+
+    if generate_data.INGEST_MODE == "incremental":
+        # Counts kept from the previous run plus the new or changed rows of the export
+        ingest = [Artifact(
+            "incremental_ingest",
+            lambda frames, p: incremental.run_incremental(tracker, p[year], p["current_month"]),
+            outputs=[cube.CUBE_FILE, PIVOT_FILE, RATES_FILE],
+            load=lambda: {**load_cube(), "sites": storage.read_artifact(incremental.SITES_STATE_FILE),
+                          **load_pivot(), "completion_rates": storage.read_artifact(RATES_FILE)},
+            produces=["cube", "sites", "pivot", "completion_rates"],
+            sources=[export, activity], parameters=[year, "current_month"],
+            modules=["pages.incremental", "pages.generate_data", "pages.cube"],
+        )]
+    elif tracker.chunksize:
+        def stream(frames, p):
+            # Streaming never holds the full export, so the cube is summed chunk by chunk
+            counts = {"cube": None}
+
+            def on_chunk(chunk):
+                counts["cube"] = cube.merge_cubes(counts["cube"], cube.build_completion_cube(chunk))
+
+            streamed = tracker.stream_completion_data(year_to_analyze=p[year], on_chunk=on_chunk)
+            tracker.save_pivot(streamed["pivot"])
+            cube.save_completion_cube(counts["cube"])
+            return {**streamed, **counts}
+
+        ingest = [Artifact(
+            "streamed_ingest", stream,
+            outputs=[FILLED_FILE, PIVOT_FILE, cube.CUBE_FILE],
+            load=lambda: {**load_filled(), **load_pivot(), **load_cube()},
+            produces=["sites", "pivot", "cube"],
+            sources=[export], parameters=[year, "stream_chunksize"],
+            modules=["pages.generate_data", "pages.cube"],
+        )]
+    else:
+        def build_filled(frames, p):
+            filled_df = tracker.ingest()
+            return {"filled": filled_df, "sites": generate_data.site_countries(filled_df)}
+
+        def build_cube(frames, p):
+            completion_cube = cube.build_completion_cube(frames["filled"])
+            cube.save_completion_cube(completion_cube)
+            return {"cube": completion_cube}
+
+        ingest = [
+            Artifact("filled", build_filled, outputs=[FILLED_FILE], load=load_filled,
+                     produces=["filled", "sites"], sources=[export], modules=["pages.generate_data"]),
+            Artifact("pivot", lambda frames, p: {"pivot": tracker.pivot(frames["filled"], year_to_analyze=p[year])},
+                     outputs=[PIVOT_FILE], load=load_pivot,
+                     produces=["pivot"], requires=["filled"], parameters=[year],
+                     modules=["pages.generate_data"]),
+            Artifact("cube", build_cube, outputs=[cube.CUBE_FILE], load=load_cube,
+                     produces=["cube"], requires=["filled"], modules=["pages.cube", "pages.generate_data"]),
+        ]
+
+    if generate_data.INGEST_MODE != "incremental":
+        ingest.append(Artifact(
+            "completion_rates",
+            lambda frames, p: {"completion_rates": tracker.completion_rates(
+                frames["pivot"], current_month=p["current_month"], year_to_analyze=p[year])},
+            outputs=[RATES_FILE], load=lambda: {"completion_rates": storage.read_artifact(RATES_FILE)},
+            produces=["completion_rates"], requires=["pivot"], sources=[activity],
+            parameters=[year, "current_month"], modules=["pages.generate_data"],
+        ))
+
+    def build_dims(frames, p):
+        dimensions = build_dimensions(frames["sites"], pd.read_csv(activity))
+        save_dimensions(dimensions)
+        return {"dimensions": dimensions}
+
+    def build_site_table(frames, p):
+        table.generate_html_table(frames["completion_with_country"])
+
+    def build_figures(frames, p):
+        plotting.generate_all_plots(frames["completion_rates"], frames["completion_with_country"], COUNTRY_AVERAGES_FILE)
+
+    def build_database(frames, p):
+        # The fact rows are read from the export chunk by chunk, whichever ingest mode built the rest
+        fact_chunks = generate_data.read_completion_chunks(export, database.DATABASE_CHUNKSIZE)
+        tables = {
+            "completion_rates": frames["completion_rates"],
+            "completion_with_country": frames["completion_with_country"],
+            "completion_cube": frames["cube"],
+            **{f"dim_{name}": df for name, df in frames["dimensions"].items()},
+        }
+        database.build_database(fact_chunks, tables, facts_version=content_hash(export))
+
+    graph = ingest + [
+        Artifact(
+            "dimensions", build_dims,
+            outputs=list(DIMENSION_FILES.values()), load=lambda: {"dimensions": load_dimensions()},
+            produces=["dimensions"], requires=["sites"], sources=[activity], modules=["dimensions"],
+        ),
+        Artifact(
+            "completion_with_country",
+            lambda frames, p: {"completion_with_country": table.add_country_to_completion_data(
+                frames["dimensions"], frames["completion_rates"], COUNTRY_FILE)},
+            outputs=[COUNTRY_FILE], load=lambda: {"completion_with_country": storage.read_artifact(COUNTRY_FILE)},
+            produces=["completion_with_country"], requires=["dimensions", "completion_rates"],
+            modules=["pages.table", "dimensions"],
+        ),
+        Artifact(
+            "site_table_html", build_site_table,
+            outputs=[SITE_TABLE_HTML], requires=["completion_with_country"], modules=["pages.table"],
+        ),
+        Artifact(
+            "figures", build_figures,
+            outputs=[COUNTRY_AVERAGES_FILE, *plotting.figure_outputs()],
+            requires=["completion_rates", "completion_with_country"], parameters=["plotlyjs_mode"],
+            modules=["pages.plotting", "aggregations"],
+        ),
+    ]
+    if database.enabled():
+        graph.append(Artifact(
+            "database", build_database, outputs=[database.DATABASE_FILE],
+            requires=["completion_rates", "completion_with_country", "cube", "dimensions"], sources=[export],
+            modules=["database", "pages.generate_data"],
+        ))
+    return graph
+
+
+def code_version(module_name):
+    """Hash of a module's source; in the frozen build the executable stands in for it."""
+    path = getattr(sys.modules.get(module_name), "__file__", None)
+    if getattr(sys, "frozen", False) or not path or not os.path.exists(path):
+        stat = os.stat(sys.executable)
+        return f"{sys.executable}:{stat.st_size}:{stat.st_mtime_ns}"
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def fingerprints(graph, parameters):
+    """Fingerprint of every artifact, from its code, parameters, sources and upstream artifacts."""
+    producers = {frame: artifact.name for artifact in graph for frame in artifact.produces}
+    source_hashes = {}
+    result = {}
+    for artifact in graph:
+        for path in artifact.sources:
+            if path not in source_hashes:
+                source_hashes[path] = content_hash(path)
+        description = {
+            "name": artifact.name,
+            "code": {module: code_version(module) for module in artifact.modules},
+            "parameters": {name: parameters[name] for name in GLOBAL_PARAMETERS + artifact.parameters},
+            "sources": {path: source_hashes[path] for path in artifact.sources},
+            "upstream": {frame: result[producers[frame]] for frame in artifact.requires},
+        }
+        result[artifact.name] = hashlib.sha256(json.dumps(description, sort_keys=True).encode("utf-8")).hexdigest()
+    return result
+
+
+def load_manifest():
+    try:
+        with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest):
+    tmp_file = MANIFEST_FILE + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_file, MANIFEST_FILE)
+
+
+def output_exists(path):
+    # DataFrame artifacts are named after their CSV but may only exist as parquet/feather
+    return storage.artifact_exists(path) if path.endswith(".csv") else os.path.exists(path)
+
+
+def run_pipeline(force=None, on_stage=None):
+    """Build every artifact whose fingerprint changed; returns the frames that were built or loaded.
+
+    Each built artifact is measured (see instrumentation); `on_stage` is called
+    with the metrics of every stage and sub-stage as it finishes.
+    """
+    force = PIPELINE_FORCE if force is None else force
+    tracker = generate_data.create_tracker()
+    graph = artifact_graph(tracker)
+    by_frame = {frame: artifact for artifact in graph for frame in artifact.produces}
+    parameters = read_parameters(tracker)
+    expected = fingerprints(graph, parameters)
+    # Entries of artifacts outside this graph (another ingest mode) no longer describe the files
+    manifest = {} if force else {name: fp for name, fp in load_manifest().items() if name in expected}
+
+    if on_stage:
+        add_listener(on_stage)
+    frames = {}
+    try:
+        for artifact in graph:
+            if manifest.get(artifact.name) == expected[artifact.name] and all(map(output_exists, artifact.outputs)):
+                print(f"Skipping {artifact.name}: unchanged")
+                continue
+            for frame in artifact.requires:
+                if frame not in frames:
+                    # Produced by an artifact that was skipped; read it back from its files
+                    frames.update(by_frame[frame].load())
+            print(f"Building {artifact.name}")
+            with stage(f"pipeline.{artifact.name}") as record:
+                built = artifact.build(frames, parameters) or {}
+                frames.update(built)
+                output = next((frame for frame in built.values() if isinstance(frame, pd.DataFrame)), None)
+                if output is not None:
+                    record.rows_out = len(output)
+            manifest[artifact.name] = expected[artifact.name]
+            save_manifest(manifest)
+    finally:
+        if on_stage:
+            remove_listener(on_stage)
+    return frames
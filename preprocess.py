@@ -2,6 +2,7 @@ import os
 import shutil
 import subprocess
 import sys
+import threading
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 os.chdir(BASE_DIR)  # Ensure script runs with correct working directory
@@ -30,34 +31,88 @@ def move_input_file(file_name):
     else:
         print(f"Error: {file_name} does not exist in the current directory.")
 
-def run_preprocessing_scripts():
+# "in-process" (default) runs every stage in this interpreter; "subprocess" is the
+# old one-interpreter-per-script chain, kept as a fallback
+PREPROCESS_MODE = os.environ.get("PREPROCESS_MODE", "in-process")
+
+def run_pipeline_in_process():
+    """Run the data, table and plotting stages over shared in-memory DataFrames."""
+    from pipeline import run_pipeline
+    run_pipeline()
+
+def run_pipeline_in_subprocesses():
+    """Run each stage as its own Python process, reading back the previous stage's CSVs."""
+    from instrumentation import stage
+
+    modules = ['pages.generate_data', 'pages.cube', 'pages.table', 'pages.plotting']
+    for module in modules:
+        print(f"Running script: {module}")
+        # The scripts log their own sub-stages under the same run id (STAGE_RUN_ID is inherited)
+        with stage(f"subprocess.{module}"):
+            subprocess.run([sys.executable, '-m', module], check=True, cwd=BASE_DIR)
+
+# One run at a time per process (e.g. the startup refresh and the input watcher)
+_run_lock = threading.Lock()
+
+def run_preprocessing_scripts(mode=None):
     """Run the required scripts for data processing and plotting."""
+    with _run_lock:
+        _run_preprocessing_scripts(mode)
+
+def _run_preprocessing_scripts(mode):
+    mode = mode or PREPROCESS_MODE
+    if mode == "subprocess" and getattr(sys, 'frozen', False):
+        # In the PyInstaller build sys.executable is the app itself, not a Python interpreter
+        print("Subprocess mode is not available in the frozen build, running in-process.")
+        mode = "in-process"
+
+    from instrumentation import stage, start_run
+    from snapshots import refresh_snapshot, snapshot_mode
+    from watcher import input_hashes, save_recorded_hashes
+
+    start_run()
+    # Hashed before the run, so a file replaced while it runs is seen as changed afterwards
+    hashes = input_hashes()
     try:
-        scripts = [
-            os.path.join(BASE_DIR, 'pages', 'generate_data.py'),
-            os.path.join(BASE_DIR, 'pages', 'table.py'),
-            os.path.join(BASE_DIR, 'pages', 'plotting.py'),
-        ]
-        
-        for script in scripts:
-            print(f"Running script: {script}")
-            subprocess.run([sys.executable, script], check=True)
+        if snapshot_mode():
+            # Build a new versioned snapshot next to the live one and switch Output to it
+            mode = "snapshot"
+        else:
+            # Output is rewritten in place; it only counts as complete again once this run succeeds
+            if os.path.exists(LOCK_FILE):
+                os.remove(LOCK_FILE)
+        if mode == "subprocess":
+            # The scripts rewrite every artifact without recording fingerprints
+            from pipeline import MANIFEST_FILE
+            if os.path.exists(MANIFEST_FILE):
+                os.remove(MANIFEST_FILE)
+        with stage(f"preprocess.{mode}"):
+            if mode == "snapshot":
+                refresh_snapshot()
+            elif mode == "subprocess":
+                run_pipeline_in_subprocesses()
+            else:
+                run_pipeline_in_process()
 
         # Create lock file after successful run
         with open(LOCK_FILE, 'w') as lock:
             lock.write("Preprocessing complete.")
+        save_recorded_hashes(hashes)
         print("Preprocessing complete. Lock file created.")
     except subprocess.CalledProcessError as e:
         print(f"Error running script {e.cmd}: {e}")
         sys.exit(1)
+    except RuntimeError as e:
+        # Snapshot build failed or another refresh is running; Output still serves the last snapshot
+        print(f"Error: {e}")
+        sys.exit(1)
 
 def check_and_run_preprocessing(file_name):
-    """Delete the lock file if it exists and run preprocessing scripts."""
-    print("Deleting the lock file if it exists...")
-    if os.path.exists(LOCK_FILE):
-        os.remove(LOCK_FILE)
-        print("Lock file removed.")
+    """Move the input file into place and bring the output up to date.
 
+    Artifacts whose inputs, parameters and code are unchanged are skipped (see
+    pipeline), so this is cheap when nothing changed.
+    """
     print("Running preprocessing scripts...")
     move_input_file(file_name)  # Move the CSV file to the Input folder
     run_preprocessing_scripts()  # Run the preprocessing scripts
@@ -66,7 +121,7 @@ def check_and_run_preprocessing(file_name):
 if __name__ == "__main__":
     file_name = "Filled_not filled.csv"
     
-    # Always run preprocessing and recreate the lock file
+    # Always check every artifact and recreate the lock file
     check_and_run_preprocessing(file_name)
     
     print("Preprocessing finished successfully!")
@@ -0,0 +1,111 @@
+"""Server-side filtering, sorting and paging for the Overview site table.
+
+The browser only receives the page of rows it displays; the full table stays in
+the server's data cache (see data_context) and every filter, sort or page
+change is answered by query_sites in a Dash callback. With QUERY_BACKEND=sqlite
+the database answers instead and the table is never loaded (see database). A
+period picked in the as-of selector is served from the completion cube.
+"""
+import os
+
+SITE_TABLE_FILE = os.path.join("Output", "completion_rates_with_activity_region_with_country.csv")
+
+# Column -> id suffix of its filter dropdown
+FILTER_COLUMNS = {"Activity": "activity", "Region": "region", "Category": "category", "country": "country"}
+RATE_COLUMNS = ['Environment', 'Health & Safety', 'Social', 'Grand Total']
+DISPLAY_COLUMNS = ["Activity", "Region", "Category", "Location", "country", *RATE_COLUMNS]
+PAGE_SIZE = 25
+# The site table's name in the database
+SITE_TABLE = "completion_with_country"
+
+
+def filter_options(df):
+    """Sorted distinct values of every filter column."""
+    return {column: sorted(df[column].dropna().unique().tolist()) for column in FILTER_COLUMNS}
+
+
+def database_filter_options():
+    import database
+
+    return {column: database.distinct_values(SITE_TABLE, column) for column in FILTER_COLUMNS}
+
+
+def page_records(rows):
+    rows = rows.astype({column: "float64" for column in RATE_COLUMNS}).round({column: 2 for column in RATE_COLUMNS})
+    # JSON has no NaN; missing rates and countries go out as null
+    rows = rows.astype(object).where(rows.notna(), None)
+    return rows.to_dict("records")
+
+
+def clamp_paging(page, page_size):
+    """(page, page_size) from the client, limited to page >= 0 and 1 <= page_size <= PAGE_SIZE."""
+    try:
+        page, page_size = int(page or 0), int(page_size or PAGE_SIZE)
+    except (TypeError, ValueError):
+        return 0, PAGE_SIZE
+    return max(page, 0), min(max(page_size, 1), PAGE_SIZE)
+
+
+def query_sites(df, filters=None, sort_by=None, page=0, page_size=PAGE_SIZE):
+    """Return one page of rows as records, plus the number of rows matching the filters.
+
+    `filters` maps a column to the values to keep (empty keeps everything) and
+    `sort_by` is a DataTable sort_by list ([{"column_id": ..., "direction": ...}]).
+    """
+    from filter_index import filter_index
+
+    matches = filter_index(df).select(df, filters or {})
+
+    sort_by = [s for s in (sort_by or []) if s["column_id"] in DISPLAY_COLUMNS]
+    if sort_by:
+        matches = matches.sort_values(
+            [s["column_id"] for s in sort_by],
+            ascending=[s["direction"] == "asc" for s in sort_by],
+            na_position="last",
+            kind="mergesort",
+        )
+
+    start = page * page_size
+    return page_records(matches.iloc[start:start + page_size][DISPLAY_COLUMNS]), len(matches)
+
+
+def query_sites_in_database(filters=None, sort_by=None, page=0, page_size=PAGE_SIZE):
+    """query_sites with the filtering, sorting and paging done by the database."""
+    import database
+
+    sort_by = [(s["column_id"], s["direction"] == "asc") for s in (sort_by or []) if s["column_id"] in DISPLAY_COLUMNS]
+    total = database.count_rows(SITE_TABLE, filters)
+    rows = database.select_rows(SITE_TABLE, DISPLAY_COLUMNS, filters, sort_by=sort_by,
+                                limit=page_size, offset=page * page_size)
+    return page_records(rows), total
+
+
+def load_site_table():
+    from data_context import load_table
+
+    return load_table(SITE_TABLE_FILE)
+
+
+# as-of period -> (its rates, the latest site table, the site table for the period)
+_site_tables_as_of = {}
+
+
+def site_table_as_of(as_of=None):
+    """The site table for a validated (year, month) from the cube, or the latest one for None.
+
+    The rates come from pages.cube.completion_rates_as_of; each location keeps the
+    Site and country of the latest table. The result is rebuilt only when either
+    frame changes, so its filter index is built once per period.
+    """
+    from pages.cube import completion_rates_as_of
+
+    latest = load_site_table()
+    rates = completion_rates_as_of(*as_of) if as_of else None
+    if rates is None:
+        return latest
+    cached = _site_tables_as_of.get(as_of)
+    if cached is None or cached[0] is not rates or cached[1] is not latest:
+        countries = latest[["Location", "Site", "country"]].drop_duplicates(subset="Location")
+        table = rates.drop_duplicates(subset="Location").merge(countries, on="Location", how="left")
+        cached = _site_tables_as_of[as_of] = (rates, latest, table)
+    return cached[2]
@@ -0,0 +1,246 @@
+"""Versioned Output/ snapshots, published atomically.
+
+With PUBLISH_MODE=snapshot every refresh builds a complete new output folder
+under Snapshots/ and only then points Output at it. Output is a symlink, and
+publishing replaces it in one rename, so a request sees either the old or the
+new snapshot, never a half-written file. Every "Output/..." path in the app
+keeps working unchanged, and the caches keyed on file signatures pick up the
+new files on their own. A refresh that finds every artifact unchanged
+publishes nothing. The last KEEP_SNAPSHOTS snapshots are kept for rollback.
+
+The pipeline writes relative to the working directory, so a snapshot is built
+in a child process whose working directory is a staging folder holding the new
+Output and a link to Input. A server can refresh in the background without
+touching the folder its own threads read from.
+
+    python snapshots.py list | refresh | rollback [VERSION]
+"""
+import datetime
+import multiprocessing
+import os
+import shutil
+import sys
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+SNAPSHOTS_DIR = os.path.join(BASE_DIR, "Snapshots")
+OUTPUT_LINK = os.path.join(BASE_DIR, "Output")
+INPUT_DIR = os.path.join(BASE_DIR, "Input")
+LOCK_FILE = os.path.join(SNAPSHOTS_DIR, ".refresh.lock")
+
+# "in-place" rewrites Output/ directly (as before); "snapshot" publishes versioned snapshots.
+# Only an explicit PUBLISH_MODE=snapshot turns Output/ into a link (see adopt_output_folder)
+PUBLISH_MODE = os.environ.get("PUBLISH_MODE", "in-place")
+KEEP_SNAPSHOTS = int(os.environ.get("KEEP_SNAPSHOTS", "3"))
+# Exit code of a build child whose pipeline skipped every artifact
+UNCHANGED_EXIT_CODE = 3
+
+
+class RefreshInProgress(RuntimeError):
+    pass
+
+
+def symlinks_supported():
+    """Windows only allows symlinks with developer mode or admin rights."""
+    os.makedirs(SNAPSHOTS_DIR, exist_ok=True)
+    probe = os.path.join(SNAPSHOTS_DIR, f".probe-{os.getpid()}")
+    try:
+        os.symlink(SNAPSHOTS_DIR, probe)
+    except (OSError, NotImplementedError):
+        return False
+    os.remove(probe)
+    return True
+
+
+def snapshot_mode():
+    """True when refreshes should publish snapshots (falls back to in-place without symlinks)."""
+    if PUBLISH_MODE != "snapshot":
+        return False
+    if not symlinks_supported():
+        print("Warning: symlinks are not available here; writing Output/ in place.")
+        return False
+    return True
+
+
+def list_snapshots():
+    """Published snapshot versions, oldest first."""
+    if not os.path.isdir(SNAPSHOTS_DIR):
+        return []
+    return sorted(
+        name for name in os.listdir(SNAPSHOTS_DIR)
+        if not name.startswith(".") and os.path.isdir(os.path.join(SNAPSHOTS_DIR, name))
+    )
+
+
+def current_snapshot():
+    """Version Output points at, or None when Output is a plain folder (or missing)."""
+    if not os.path.islink(OUTPUT_LINK):
+        return None
+    return os.path.basename(os.path.normpath(os.readlink(OUTPUT_LINK)))
+
+
+def new_version(when=None):
+    # Sortable by time; the pid keeps builds started at the same moment apart
+    when = when or datetime.datetime.now()
+    return when.strftime("%Y%m%d-%H%M%S-%f") + f"-{os.getpid()}"
+
+
+def adopt_output_folder():
+    """Move a plain Output/ folder into Snapshots/ so it can be rolled back to.
+
+    Only happens once, before the first snapshot build, and changes the project
+    layout: Output becomes a symlink to Snapshots/<version>, so git reports the
+    tracked Output/ files as replaced by a link. A directory cannot be swapped for
+    a symlink in one rename, so the link is made first and put in place right
+    after the folder moves; Output is missing only between those two renames.
+    """
+    if os.path.isdir(OUTPUT_LINK) and not os.path.islink(OUTPUT_LINK):
+        # Named after its last change, so it sorts before every snapshot built from now on
+        version = new_version(datetime.datetime.fromtimestamp(os.path.getmtime(OUTPUT_LINK)))
+        tmp_link = snapshot_link(version)
+        os.rename(OUTPUT_LINK, os.path.join(SNAPSHOTS_DIR, version))
+        os.replace(tmp_link, OUTPUT_LINK)
+        print(f"Output/ moved to snapshot {version}; Output is now a link to it")
+
+
+def snapshot_link(version):
+    """A new symlink to a snapshot next to Output, ready to be renamed over it."""
+    tmp_link = f"{OUTPUT_LINK}.{os.getpid()}.tmp"
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    # Relative target, so the project folder can be moved
+    os.symlink(os.path.join(os.path.basename(SNAPSHOTS_DIR), version), tmp_link)
+    return tmp_link
+
+
+def point_output_at(version):
+    """Atomically switch Output to a published snapshot."""
+    if not os.path.isdir(os.path.join(SNAPSHOTS_DIR, version)):
+        raise FileNotFoundError(f"No snapshot {version} in {SNAPSHOTS_DIR}")
+    os.replace(snapshot_link(version), OUTPUT_LINK)
+    print(f"Output now points at snapshot {version}")
+
+
+def prune_snapshots(keep=None):
+    """Delete all but the newest `keep` snapshots; the current one is always kept."""
+    keep = KEEP_SNAPSHOTS if keep is None else keep
+    current = current_snapshot()
+    versions = list_snapshots()
+    for version in versions[:max(0, len(versions) - keep)]:
+        if version != current:
+            shutil.rmtree(os.path.join(SNAPSHOTS_DIR, version), ignore_errors=True)
+            print(f"Removed old snapshot {version}")
+
+
+def acquire_lock():
+    """Claim the refresh lock; a lock left by a process that no longer runs is taken over."""
+    os.makedirs(SNAPSHOTS_DIR, exist_ok=True)
+    try:
+        fd = os.open(LOCK_FILE, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            with open(LOCK_FILE, "r") as f:
+                pid = int(f.read().strip() or 0)
+            os.kill(pid, 0)
+        except (OSError, ValueError):
+            os.remove(LOCK_FILE)
+            return acquire_lock()
+        raise RefreshInProgress(f"A refresh is already running (pid {pid})")
+    with os.fdopen(fd, "w") as f:
+        f.write(str(os.getpid()))
+
+
+def release_lock():
+    if os.path.exists(LOCK_FILE):
+        os.remove(LOCK_FILE)
+
+
+def run_pipeline_in(build_dir):
+    """Child process entry point: run the whole pipeline with `build_dir` as working directory.
+
+    Exits with UNCHANGED_EXIT_CODE when every artifact was skipped.
+    """
+    os.chdir(build_dir)
+    sys.path.insert(0, BASE_DIR)
+    from pipeline import run_pipeline
+
+    built = []
+    run_pipeline(on_stage=lambda entry: built.append(entry) if entry["stage"].startswith("pipeline.") else None)
+    if not built:
+        sys.exit(UNCHANGED_EXIT_CODE)
+
+
+def build_snapshot():
+    """Build a complete snapshot in a child process; returns its version, ready to publish.
+
+    The live snapshot is copied rather than linked, since artifacts are rewritten in place.
+    Returns None when the live snapshot was already up to date; the copy is discarded.
+    """
+    version = new_version()
+    build_dir = os.path.join(SNAPSHOTS_DIR, f".build-{version}")
+    current = current_snapshot()
+    if current and os.path.isdir(os.path.join(SNAPSHOTS_DIR, current)):
+        # Start from a copy of the live snapshot so unchanged artifacts are skipped, not rebuilt
+        shutil.copytree(os.path.join(SNAPSHOTS_DIR, current), os.path.join(build_dir, "Output"))
+    else:
+        os.makedirs(os.path.join(build_dir, "Output"))
+    os.symlink(INPUT_DIR, os.path.join(build_dir, "Input"))
+    try:
+        # spawn: a fresh interpreter, so the build never shares state with a serving process
+        process = multiprocessing.get_context("spawn").Process(target=run_pipeline_in, args=(build_dir,))
+        process.start()
+        process.join()
+        if process.exitcode == UNCHANGED_EXIT_CODE and current:
+            return None
+        if process.exitcode not in (0, UNCHANGED_EXIT_CODE):
+            raise RuntimeError(f"Snapshot build failed with exit code {process.exitcode}")
+        os.rename(os.path.join(build_dir, "Output"), os.path.join(SNAPSHOTS_DIR, version))
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+    return version
+
+
+def refresh_snapshot(keep=None):
+    """Build a new snapshot, publish it and prune old ones. Returns the version being served."""
+    acquire_lock()
+    try:
+        adopt_output_folder()
+        version = build_snapshot()
+        if version is None:
+            version = current_snapshot()
+            print(f"Output is up to date; still serving snapshot {version}")
+            return version
+        point_output_at(version)
+        prune_snapshots(keep)
+        return version
+    finally:
+        release_lock()
+
+
+def rollback(version=None):
+    """Point Output back at `version`, or at the snapshot before the current one."""
+    versions = list_snapshots()
+    if version is None:
+        current = current_snapshot()
+        older = [v for v in versions if current is None or v < current]
+        if not older:
+            raise RuntimeError("No older snapshot to roll back to")
+        version = older[-1]
+    point_output_at(version)
+    return version
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    if command == "refresh":
+        refresh_snapshot()
+    elif command == "rollback":
+        rollback(sys.argv[2] if len(sys.argv) > 2 else None)
+    else:
+        current = current_snapshot()
+        for version in list_snapshots():
+            print(("* " if version == current else "  ") + version)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,187 @@
+"""Read and write the DataFrame artifacts in Output/.
+
+Artifacts keep their historical CSV names (e.g. "Output/filled_0_1.csv") as
+identifiers. When pyarrow is installed they are stored in a columnar format
+next to that name ("Output/filled_0_1.parquet"), which keeps dtypes and loads
+much faster; the CSV itself is only written for the final, human-facing tables.
+Writing an artifact removes its copies in other formats, so a reader never
+picks up an older one.
+"""
+import os
+import pandas as pd
+
+from instrumentation import record_read, record_write
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# "parquet", "feather" or "csv"
+INTERMEDIATE_FORMAT = os.environ.get("INTERMEDIATE_FORMAT", "parquet" if HAS_PYARROW else "csv")
+# Set EXPORT_CSV=0 to skip the CSV copies of the final tables
+EXPORT_CSV = os.environ.get("EXPORT_CSV", "1") != "0"
+
+EXTENSIONS = {"parquet": ".parquet", "feather": ".feather", "csv": ".csv"}
+
+
+def configured_format():
+    return INTERMEDIATE_FORMAT if HAS_PYARROW else "csv"
+
+
+def artifact_paths(path):
+    """Return every on-disk candidate for an artifact, the configured format first."""
+    base = os.path.splitext(path)[0]
+    formats = [configured_format()] + [fmt for fmt in ("parquet", "feather", "csv") if fmt != configured_format()]
+    return [base + EXTENSIONS[fmt] for fmt in formats]
+
+
+def resolve_artifact(path):
+    """Return the file an artifact is read from, or None if there is none.
+
+    The configured format wins whenever it exists; mtimes are not compared, since
+    a checkout or copy can make an old file look new. Other formats are only a
+    fallback, e.g. the committed CSV exports before the first run.
+    """
+    return next((p for p in artifact_paths(path) if os.path.exists(p)), None)
+
+
+def remove_stale_copies(path, keep):
+    """Delete the copies of an artifact in other formats than the `keep` files just written."""
+    for candidate in artifact_paths(path):
+        if candidate not in keep and os.path.exists(candidate):
+            os.remove(candidate)
+
+
+def artifact_exists(path):
+    return resolve_artifact(path) is not None
+
+
+def write_artifact(df, path, export_csv=False, fmt=None, **to_csv_kwargs):
+    """Write an artifact in the intermediate format, plus CSV when `export_csv` is set.
+
+    `to_csv_kwargs` only apply to the CSV copy. Returns the path of the primary file.
+    """
+    fmt = fmt or INTERMEDIATE_FORMAT
+    if fmt != "csv" and not HAS_PYARROW:
+        fmt = "csv"
+    base = os.path.splitext(path)[0]
+    csv_path = base + ".csv"
+
+    if fmt == "csv":
+        df.to_csv(csv_path, **to_csv_kwargs)
+        record_write(csv_path)
+        remove_stale_copies(path, [csv_path])
+        return csv_path
+
+    written = []
+    if export_csv and EXPORT_CSV:
+        df.to_csv(csv_path, **to_csv_kwargs)
+        record_write(csv_path)
+        written.append(csv_path)
+
+    # Columnar files hold plain columns. As with to_csv, the index is kept (as the
+    # first column, which is how read_csv returns it) unless index=False is passed
+    columnar_df = df.reset_index(drop=not to_csv_kwargs.get("index", True))
+    columnar_path = base + EXTENSIONS[fmt]
+    if fmt == "feather":
+        columnar_df.to_feather(columnar_path)
+    else:
+        columnar_df.to_parquet(columnar_path, index=False)
+    record_write(columnar_path)
+    remove_stale_copies(path, written + [columnar_path])
+    return columnar_path
+
+
+def read_artifact(path, columns=None, **read_csv_kwargs):
+    """Read an artifact from its fastest fresh copy.
+
+    `read_csv_kwargs` only apply when falling back to CSV; columnar files already
+    carry their dtypes.
+    """
+    resolved = resolve_artifact(path)
+    if resolved is None:
+        raise FileNotFoundError(f"File not found: {path}")
+    record_read(resolved)
+    if resolved.endswith(".parquet"):
+        return pd.read_parquet(resolved, columns=columns)
+    if resolved.endswith(".feather"):
+        return pd.read_feather(resolved, columns=columns)
+    return pd.read_csv(resolved, usecols=columns, **read_csv_kwargs)
+
+
+def load_frame(source):
+    """Return a copy of an in-memory DataFrame, or read the artifact at a path."""
+    if isinstance(source, pd.DataFrame):
+        return source.copy()
+    return read_artifact(source)
+
+
+class ChunkedArtifactWriter:
+    """Write an artifact one DataFrame chunk at a time, for data too large to hold at once.
+
+    CSV chunks are appended; Parquet chunks become row groups. Feather cannot be
+    appended to, so it is written as Parquet here. `dtypes` ({column: dtype})
+    declares the Parquet column types; categoricals are stored as strings.
+    Undeclared columns take the type of the first chunk. Use as a context manager.
+    """
+
+    def __init__(self, path, fmt=None, index=True, dtypes=None):
+        fmt = fmt or INTERMEDIATE_FORMAT
+        if fmt != "csv" and not HAS_PYARROW:
+            fmt = "csv"
+        self.fmt = "parquet" if fmt == "feather" else fmt
+        self.path = os.path.splitext(path)[0] + EXTENSIONS[self.fmt]
+        self.index = index
+        self.dtypes = dtypes or {}
+        self._writer = None
+        self._started = False
+
+    def write(self, df):
+        if self.fmt == "csv":
+            df.to_csv(self.path, mode="a" if self._started else "w", header=not self._started, index=self.index)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            df = df.reset_index(drop=not self.index)
+            # Every chunk has its own categories; store plain values so all row groups share one schema
+            categorical = df.select_dtypes("category").columns
+            df = df.astype({column: object for column in categorical})
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, self.schema(df))
+            table = pa.Table.from_pandas(df, schema=self._writer.schema, preserve_index=False)
+            self._writer.write_table(table)
+        self._started = True
+
+    def schema(self, df):
+        """Arrow schema for all chunks; a chunk alone can't tell, e.g. when a column is empty in it."""
+        import pyarrow as pa
+
+        inferred = pa.Schema.from_pandas(df, preserve_index=False)
+        fields = []
+        for field in inferred:
+            dtype = self.dtypes.get(field.name)
+            if dtype is None:
+                fields.append(field)
+            elif str(dtype) in ("category", "object", "str", "string"):
+                fields.append(pa.field(field.name, pa.string()))
+            else:
+                fields.append(pa.field(field.name, pa.from_numpy_dtype(pd.api.types.pandas_dtype(dtype))))
+        return pa.schema(fields)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._started:
+            record_write(self.path)
+            remove_stale_copies(self.path, [self.path])
+            self._started = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -82,3 +82,52 @@ def make_dash_table(df):
             html_row.append(html.Td([row[i]]))
         table.append(html.Tr(html_row))
     return table
+
+
+def get_cube_years():
+    from pages.cube import cube_periods
+
+    return [year for year, _ in cube_periods()]
+
+
+def get_default_period():
+    """The (year, month) the period selector starts on, or None when there is no cube for it."""
+    from pages.generate_data import read_dashboard_parameters
+
+    parameters = read_dashboard_parameters()
+    year = parameters.get("year_to_analyze", 2024)
+    month = parameters.get("current_month", 11)
+    return (year, month) if year in get_cube_years() else None
+
+
+def get_period_selector():
+    """Year/month dropdowns for viewing completion rates as of any period in the cube."""
+    from pages.generate_data import read_dashboard_parameters
+
+    years = get_cube_years()
+    parameters = read_dashboard_parameters()
+    year = parameters.get("year_to_analyze", 2024)
+    month = parameters.get("current_month", 11)
+
+    months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+    return html.Div(
+        [
+            html.Label("As of", className="period-label"),
+            dcc.Dropdown(
+                id="as-of-year",
+                options=[{"label": str(y), "value": y} for y in years],
+                value=year if year in years else None,
+                clearable=False,
+                style={"width": "100px", "display": "inline-block"},
+            ),
+            dcc.Dropdown(
+                id="as-of-month",
+                options=[{"label": name, "value": i} for i, name in enumerate(months, start=1)],
+                value=month,
+                clearable=False,
+                style={"width": "100px", "display": "inline-block"},
+            ),
+        ],
+        className="row period-selector",
+        style={"display": "flex" if years else "none", "gap": "10px", "align-items": "center"},
+    )
@@ -0,0 +1,136 @@
+"""Refresh the dashboard output automatically when the input files change.
+
+Only the watched input files are checked (one stat each per WATCH_INTERVAL),
+not the folder tree. A change starts a refresh once the files have been quiet
+for WATCH_DEBOUNCE seconds, so an export written in several bursts triggers a
+single run. Before refreshing, the content of the files is hashed and compared
+with the inputs of the last refresh; touching or re-copying an identical file
+does not recompute anything.
+
+    python watcher.py              # alongside gunicorn, or on its own
+    WATCH_INPUT=1 python app.py    # inside the local dashboard
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+INPUT_DIR = os.path.join(BASE_DIR, "Input")
+WATCHED_FILES = [
+    os.path.join(INPUT_DIR, "Filled_not filled.csv"),
+    os.path.join(INPUT_DIR, "Activity_Region_Category.csv"),
+]
+# Content hashes of the inputs the current output was built from (written by every successful run)
+HASH_FILE = os.path.join(INPUT_DIR, ".input_hashes.json")
+
+WATCH_INTERVAL = float(os.environ.get("WATCH_INTERVAL", "1"))
+WATCH_DEBOUNCE = float(os.environ.get("WATCH_DEBOUNCE", "5"))
+HASH_CHUNK_BYTES = 1 << 20
+
+
+def file_state(path):
+    """(mtime_ns, size) of a file, or None when it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def watched_state():
+    return tuple(file_state(path) for path in WATCHED_FILES)
+
+
+def content_hash(path):
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def input_hashes():
+    return {os.path.basename(path): content_hash(path) for path in WATCHED_FILES}
+
+
+def load_recorded_hashes():
+    try:
+        with open(HASH_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_recorded_hashes(hashes):
+    tmp_file = HASH_FILE + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(hashes, f, indent=2)
+    os.replace(tmp_file, HASH_FILE)
+
+
+def refresh():
+    """Recompute the output; returns True when the run succeeded."""
+    from preprocess import run_preprocessing_scripts
+
+    try:
+        run_preprocessing_scripts()
+    except SystemExit:
+        # preprocess exits on a failed run; the watcher keeps the last good output and keeps watching
+        print("Refresh failed; the previous output is still served.")
+        return False
+    except Exception as e:
+        # e.g. a malformed export; the thread must survive it to see the corrected file
+        print(f"Refresh failed ({type(e).__name__}: {e}); the previous output is still served.")
+        return False
+    return True
+
+
+def refresh_if_changed():
+    """Refresh when the input content differs from the last refresh. Returns True if it ran."""
+    hashes = input_hashes()
+    if hashes == load_recorded_hashes():
+        print("Input content is unchanged since the last refresh; skipping it.")
+        return False
+    print("Input files changed; refreshing the output...")
+    return refresh()
+
+
+def watch(stop=None, interval=None, debounce=None):
+    """Watch the input files until `stop` (a threading.Event) is set."""
+    stop = stop or threading.Event()
+    interval = WATCH_INTERVAL if interval is None else interval
+    debounce = WATCH_DEBOUNCE if debounce is None else debounce
+
+    print(f"Watching {', '.join(os.path.basename(path) for path in WATCHED_FILES)} in {INPUT_DIR}")
+    last_state = watched_state()
+    changed_at = None
+    # Catch up on changes made while nothing was watching; with no recorded hashes this
+    # rebuilds, and the pipeline fingerprints keep an unchanged input cheap
+    refresh_if_changed()
+    while not stop.wait(interval):
+        state = watched_state()
+        if state != last_state:
+            # Still being written: restart the quiet period
+            last_state = state
+            changed_at = time.monotonic()
+        elif changed_at is not None and time.monotonic() - changed_at >= debounce:
+            changed_at = None
+            refresh_if_changed()
+
+
+def start_watcher():
+    """Watch in a daemon thread; returns the Event that stops it."""
+    stop = threading.Event()
+    threading.Thread(target=watch, args=(stop,), name="input-watcher", daemon=True).start()
+    return stop
+
+
+if __name__ == "__main__":
+    try:
+        watch()
+    except KeyboardInterrupt:
+        pass